@@ -0,0 +1,180 @@
+"""
+Benchmark every command against synthetic changelogs of increasing size, both in-process through
+ChangelogUtils and end-to-end through the console script.
+
+Run from the repository root with ``python benchmarks/bench_commands.py``. Results are written as JSON
+to ``benchmarks/results/<commit>.json``; pass ``--compare`` an earlier results file to print the change
+in each timing, e.g. ``python benchmarks/bench_commands.py --compare benchmarks/results/<base>.json``.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from changelog.templates import INIT, SECTIONS
+from changelog.utils import ChangelogUtils
+
+SIZES = (10, 1000, 100000, 1000000)
+COMMANDS = ('init', 'new', 'release', 'suggest', 'current', 'view')
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+OPTIONS = [
+    ("new", "Adding a new feature {}"),
+    ("change", "Changing a feature {}"),
+    ("fix", "fix a bug {}"),
+    ("break", "breaking change {}"),
+]
+
+
+def synthetic_changelog(lines, seed=0):
+    """
+    Returns the lines of a changelog about lines long: an Unreleased block with a few entries
+    followed by releases of random entries, newest first, as the cli would have written them.
+    """
+    rng = random.Random(seed)
+    blocks = []
+    length = len(INIT.splitlines())
+    while length < lines:
+        entries = [rng.choice(OPTIONS) for _ in range(rng.randrange(1, 6))]
+        block = ["---\n"]
+        for section, message in OPTIONS:
+            messages = [text.format(rng.random()) for name, text in entries if name == section]
+            if messages:
+                block.extend(["\n", SECTIONS[section]])
+                block.extend("* {}\n".format(message) for message in messages)
+        block.extend(["\n", "\n"])
+        blocks.append(block)
+        length += len(block) + 1
+    output = INIT.splitlines(True)
+    for section, message in OPTIONS[:rng.randrange(1, 4)]:
+        output.insert(output.index(SECTIONS[section]) + 1, "* {}\n".format(message.format(rng.random())))
+    for i, block in enumerate(blocks):
+        output.append("## 0.{}.0 - (2017-06-09)\n".format(len(blocks) - i))
+        output.extend(block)
+    return output
+
+
+def in_process(command, path):
+    """
+    Gets a function running command against the changelog at path through ChangelogUtils,
+    as a fresh invocation that has not parsed the changelog yet
+    """
+    run = {
+        'init': lambda CL: CL.initialize_changelog_file(),
+        'new': lambda CL: CL.update_section('new', 'Adding a benchmarked feature'),
+        'release': lambda CL: CL.cut_release('suggest'),
+        'suggest': lambda CL: CL.get_new_release_version('suggest'),
+        'current': lambda CL: CL.get_current_version(),
+        'view': lambda CL: CL.get_current_lines(),
+    }[command]
+    return lambda: run(ChangelogUtils(path))
+
+
+def end_to_end(command, path):
+    """Gets a function running command in the directory of path through the console script"""
+    script = shutil.which('changelog')
+    executable = [script] if script else [sys.executable, '-m', 'changelog']
+    args = {
+        'new': ['new', 'Adding a benchmarked feature'],
+        'release': ['release', '--yes'],
+    }.get(command, [command])
+    directory = os.path.dirname(path)
+    return lambda: subprocess.check_call(executable + args, cwd=directory, stdout=subprocess.DEVNULL)
+
+
+def measure(function, source, path, repeat):
+    """Times function, restoring the changelog at path from source before every run"""
+    timings = []
+    for _ in range(repeat):
+        if source is None:
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            shutil.copyfile(source, path)
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {'best': timings[0], 'median': timings[len(timings) // 2], 'repeat': repeat}
+
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).decode('utf-8').strip()
+    except (EnvironmentError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, commands, repeat):
+    results = []
+    directory = tempfile.mkdtemp()
+    try:
+        source = os.path.join(directory, 'source.md')
+        work = os.path.join(directory, 'work')
+        os.mkdir(work)
+        path = os.path.join(work, 'CHANGELOG.md')
+        for lines in sizes:
+            with open(source, 'w') as changelog:
+                changelog.writelines(synthetic_changelog(lines))
+            for command in commands:
+                for mode, runner in [('in-process', in_process), ('end-to-end', end_to_end)]:
+                    timing = measure(
+                        runner(command, path), None if command == 'init' else source, path,
+                        max(1, repeat if lines < 100000 else repeat // 3),
+                    )
+                    timing.update({'command': command, 'mode': mode, 'lines': lines})
+                    results.append(timing)
+                    print("{:<8} {:<11} {:>8} lines {:>10.4f}s".format(command, mode, lines, timing['best']))
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def compare(results, baseline):
+    """Prints the change in best timing of every result also in the baseline results"""
+    previous = {(r['command'], r['mode'], r['lines']): r['best'] for r in baseline['results']}
+    print("\nCompared to {}:".format(baseline.get('commit')))
+    for result in results:
+        key = (result['command'], result['mode'], result['lines'])
+        if key in previous:
+            print("{:<8} {:<11} {:>8} lines {:>+9.1f}%".format(
+                key[0], key[1], key[2], (result['best'] / previous[key] - 1) * 100
+            ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="Changelog sizes in lines")
+    parser.add_argument('--commands', nargs='+', choices=COMMANDS, default=COMMANDS)
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per timing, a third of it from 100k lines")
+    parser.add_argument('--output', help="Results file, by default benchmarks/results/<commit>.json")
+    parser.add_argument('--compare', help="Earlier results file to compare with")
+    args = parser.parse_args(argv)
+
+    revision = commit()
+    results = run(args.sizes, args.commands, args.repeat)
+    output = args.output or os.path.join(RESULTS, '{}.json'.format(revision or 'latest'))
+    if not os.path.isdir(os.path.dirname(os.path.abspath(output))):
+        os.makedirs(os.path.dirname(os.path.abspath(output)))
+    with open(output, 'w') as results_file:
+        json.dump({
+            'commit': revision,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.time(),
+            'results': results,
+        }, results_file, indent=2)
+    print("Results written to {}".format(output))
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+
+
+if __name__ == '__main__':
+    main()
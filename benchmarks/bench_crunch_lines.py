@@ -0,0 +1,57 @@
+"""
+Benchmark crunch_lines against the original pop-based implementation.
+
+Run from the repository root with ``python benchmarks/bench_crunch_lines.py``.
+"""
+import random
+import timeit
+
+from changelog.utils import ChangelogUtils
+
+LINES = 100000
+
+
+def quadratic_crunch_lines(line_list):
+    """Original pop-based crunch_lines, O(n^2) in the number of removed blank lines"""
+    i = 2
+    while i < len(line_list):
+        here = line_list[i]
+        minus_1 = line_list[i - 1]
+        minus_2 = line_list[i - 2]
+        if here == minus_1 == minus_2 == "\n":
+            line_list.pop(i)
+        elif minus_2 == '---\n' and here == minus_1 == '\n':
+            line_list.pop(i)
+        else:
+            i += 1
+    return line_list
+
+
+def synthetic_changelog(lines, seed=0):
+    """Release blocks separated by long runs of blank lines, as repeated releases leave behind"""
+    rng = random.Random(seed)
+    output = []
+    release = 0
+    while len(output) < lines:
+        release += 1
+        output.extend(["## 0.{}.0 - (2017-06-09)\n".format(release), "---\n"])
+        output.extend(["\n"] * rng.randrange(1, 8))
+        output.append("### New\n")
+        output.extend("* entry {}\n".format(i) for i in range(rng.randrange(1, 5)))
+        output.extend(["\n"] * rng.randrange(1, 8))
+    return output[:lines]
+
+
+def main():
+    data = synthetic_changelog(LINES)
+    assert ChangelogUtils().crunch_lines(list(data)) == quadratic_crunch_lines(list(data))
+    for name, function in [
+        ('crunch_lines', ChangelogUtils().crunch_lines),
+        ('quadratic_crunch_lines', quadratic_crunch_lines),
+    ]:
+        best = min(timeit.repeat(lambda: function(list(data)), number=1, repeat=3))
+        print("{:<24} {:>10.4f}s  ({} lines)".format(name, best, LINES))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark the peak memory of the mutating commands on large changelogs, as reported by tracemalloc.
+
+Run from the repository root with ``python benchmarks/bench_memory.py [SIZE_MB ...]``,
+by default against 10 MB and 100 MB synthetic changelogs.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from changelog.utils import ChangelogUtils
+
+SIZES_MB = (10, 100)
+
+
+class FullRewriteUtils(ChangelogUtils):
+    """Cuts releases through the full streaming rewrite rather than only rewriting the head"""
+
+    def _write_head(self, head, document, release):
+        return False
+
+
+def synthetic_changelog(path, size):
+    """Writes an initialized changelog followed by releases of 20 entries until it is size bytes"""
+    ChangelogUtils(path).initialize_changelog_file()
+    with open(path, 'a') as changelog:
+        release = size // 1000
+        while changelog.tell() < size:
+            changelog.write("## 0.{}.0 - (2017-06-09)\n---\n\n### New\n".format(release))
+            changelog.writelines("* entry {} of a synthetic release\n".format(i) for i in range(20))
+            changelog.write("\n")
+            release -= 1
+
+
+def in_memory_release(CL):
+    """The previous cut_release, holding every line of the file and of the output in lists"""
+    document = CL.get_document()
+    output = document.release_lines("## 9.9.9 - (2017-06-09)\n", document.get_changes())
+    CL.write_changelog(CL.crunch_lines(output))
+
+
+def measure(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(sizes):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'CHANGELOG.md')
+        for size in sizes:
+            synthetic_changelog(path, size * 1024 * 1024)
+            CL = ChangelogUtils(path)
+            CL.update_section('new', 'warm up imports')
+            print("{} MB changelog".format(size))
+            for name, function in [
+                ('update_section', lambda: CL.update_section('fix', 'in place')),
+                ('update_sections', lambda: CL.update_sections([('new', 'a'), ('fix', 'b')])),
+                ('cut_release', lambda: CL.cut_release('patch')),
+                ('cut_release (full)', lambda: FullRewriteUtils(path).cut_release('patch')),
+                ('cut_release (in memory)', lambda: in_memory_release(ChangelogUtils(path))),
+            ]:
+                print("  {:<24} {:>10.2f} MB peak".format(name, measure(function) / 1024.0 / 1024.0))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or SIZES_MB)
@@ -0,0 +1,85 @@
+"""
+Benchmark the memory held by many parsed changelogs at once, as in a process reporting on the
+changelogs of many repositories, as reported by tracemalloc.
+
+Run from the repository root with ``python benchmarks/bench_model.py``, by default loading 200
+synthetic changelogs of 1000 lines each. Compares the list of lines of ChangelogDocument, alone and
+with a Version built for every release, with the buffer and offsets of CompactChangelog.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from packaging.version import Version
+
+from bench_commands import synthetic_changelog
+from changelog.document import ChangelogDocument
+from changelog.model import CompactChangelog
+
+
+def load_lines(path):
+    with open(path) as changelog:
+        document = ChangelogDocument(changelog.readlines())
+    document.read()
+    return document
+
+
+def load_lines_and_versions(path):
+    document = load_lines(path)
+    return document, [Version(release.version) for release in document.releases]
+
+
+MODELS = [
+    ('lines', load_lines),
+    ('lines + versions', load_lines_and_versions),
+    ('compact', CompactChangelog.from_path),
+]
+
+
+def measure(load, paths):
+    """Loads every path, returning the memory held by the results, the peak and the seconds taken"""
+    tracemalloc.start()
+    try:
+        started = time.time()
+        loaded = [load(path) for path in paths]
+        elapsed = time.time() - started
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del loaded
+    return current, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repositories', type=int, default=200, help="Number of changelogs to load.")
+    parser.add_argument('--lines', type=int, default=1000, help="Lines in each changelog.")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = []
+        size = 0
+        for repository in range(args.repositories):
+            path = os.path.join(directory, '{}.md'.format(repository))
+            with open(path, 'w') as changelog:
+                changelog.writelines(synthetic_changelog(args.lines, seed=repository))
+            size += os.path.getsize(path)
+            paths.append(path)
+        print("{} changelogs of {} lines, {:.2f} MB on disk".format(
+            args.repositories, args.lines, size / 1024.0 / 1024.0
+        ))
+        for name, load in MODELS:
+            current, peak, elapsed = measure(load, paths)
+            print("  {:<18} {:>10.2f} MB held {:>10.2f} MB peak {:>8.2f} s".format(
+                name, current / 1024.0 / 1024.0, peak / 1024.0 / 1024.0, elapsed
+            ))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
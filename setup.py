@@ -40,8 +40,8 @@ setup(
     extras_require={'dev': dev_requirements},
     entry_points={
         'console_scripts': [
-            'changelog=changelog.commands:cli',
-            'cl=changelog.commands:cli'
+            'changelog=changelog.main:main',
+            'cl=changelog.main:main'
         ]
     },
     classifiers=[
@@ -0,0 +1,3 @@
+from changelog.api import Changelog
+
+__all__ = ['Changelog']
@@ -0,0 +1,4 @@
+from changelog.main import main
+
+if __name__ == '__main__':
+    main()
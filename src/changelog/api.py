@@ -0,0 +1,183 @@
+"""
+Python API for working with changelogs held in memory.
+
+A Changelog is built from a string, bytes, a file-like object or a path, and every operation works
+on its lines without touching the disk or depending on the working directory, so any number of them
+can be used side by side, e.g. from threads::
+
+    from changelog import Changelog
+
+    notes = Changelog.from_bytes(blob)
+    notes.add('fix', "Fixed a bug")
+    version = notes.release()
+    data = notes.to_bytes()
+
+Changelog.from_path and Changelog.save are the only methods that read or write files. Entry journals
+(``.changelog.d``) belong to changelogs on disk and are not merged in; use ChangelogUtils for those.
+"""
+import io
+
+from changelog.document import (
+    ChangelogDocument,
+    Unreleased,
+    iter_crunched_lines,
+    parse_sections,
+    release_record,
+)
+from changelog.templates import DEFAULT_VERSION, INIT, RELEASE_LINE
+from changelog.versions import (
+    RELEASE_TYPES,
+    find_release,
+    new_release_version,
+    parse_version,
+    releases_between,
+    suggest_release_type,
+)
+
+
+class Changelog(object):
+    """
+    A changelog held in memory as a list of lines. Without lines it starts out as a new changelog.
+    """
+
+    def __init__(self, lines=None):
+        self.lines = list(lines) if lines is not None else INIT.splitlines(True)
+        self._document = None
+
+    @classmethod
+    def from_string(cls, text):
+        """Parses a changelog from its text, keeping its \\n, \\r\\n or \\r line endings for the lines it writes"""
+        if isinstance(text, bytes):  # a str on Python 2
+            text = text.decode('utf-8')
+        return cls(io.StringIO(text, newline=''))
+
+    @classmethod
+    def from_bytes(cls, data, encoding='utf-8'):
+        """Parses a changelog from its encoded contents"""
+        return cls.from_string(data.decode(encoding))
+
+    @classmethod
+    def from_file(cls, changelog, encoding='utf-8'):
+        """Parses a changelog from a file-like object opened in text or binary mode"""
+        data = changelog.read()
+        if isinstance(data, bytes):
+            return cls.from_bytes(data, encoding)
+        return cls.from_string(data)
+
+    @classmethod
+    def from_path(cls, path, encoding='utf-8'):
+        """Reads and parses the changelog at path"""
+        with open(path, 'rb') as changelog:
+            return cls.from_bytes(changelog.read(), encoding)
+
+    @property
+    def document(self):
+        """The parsed ChangelogDocument of the current lines"""
+        if self._document is None:
+            self._document = ChangelogDocument(self.lines)
+        return self._document
+
+    def _replace_lines(self, lines):
+        self.lines = lines
+        self._document = None
+
+    def get_current_version(self):
+        """Gets the version of the most recent release, or the default version if nothing has been released"""
+        release = self.document.current_release
+        return parse_version(release.version if release is not None else DEFAULT_VERSION)
+
+    def get_changes(self):
+        """Gets the last entry logged in each section of the Unreleased block"""
+        return self.document.get_changes()
+
+    def get_release_suggestion(self):
+        """Suggests a release type for the logged changes"""
+        return suggest_release_type(self.get_changes())
+
+    def get_new_release_version(self, release_type='suggest', local=None):
+        """Returns the version a release of release_type would get, see ChangelogUtils.get_new_release_version"""
+        if release_type not in RELEASE_TYPES:
+            release_type = self.get_release_suggestion()
+        return new_release_version(self.get_current_version(), release_type, local=local)
+
+    def add(self, section, message):
+        """Adds message to the top of section ('new', 'change', 'fix' or 'break') in the Unreleased block"""
+        self.add_entries([(section, message)])
+
+    def add_entries(self, entries):
+        """Adds every (section, message) pair of entries, the last one given for a section ending up on top"""
+        self._replace_lines(self.document.insert_entries(entries))
+
+    def release(self, release_type='suggest', local=None, date=None):
+        """
+        Turns the Unreleased block into a release dated date (default: today) and returns its version
+        """
+        if date is None:
+            import datetime
+            date = datetime.date.today()
+        version = self.get_new_release_version(release_type, local=local)
+        release_line = RELEASE_LINE.format(version, date.isoformat())
+        lines = self.document.release_lines(release_line, self.get_changes())
+        self._replace_lines(list(iter_crunched_lines(lines)))
+        return version
+
+    def get_current_lines(self):
+        """Gets the lines up to the end of the current release, as shown by ``changelog view``"""
+        document = self.document
+        document.read(2)
+        end = document.releases[1].start if len(document.releases) > 1 else len(document.lines)
+        return document.lines[:end]
+
+    def iter_release_records(self):
+        """Yields the record of each release, newest first, see changelog.document.release_record"""
+        document = self.document
+        for release in document.iter_releases():
+            yield release_record(release.version, release.date, document.release_sections(release))
+
+    def get_unreleased(self):
+        """Gets the Unreleased block, with the entries and counts of every section"""
+        self.document.read_unreleased()
+        unreleased = self.document.unreleased
+        return unreleased if unreleased is not None else Unreleased(None, None)
+
+    def get_unreleased_record(self):
+        """Gets the record of the Unreleased block, with no version or date"""
+        return release_record(None, None, self.get_unreleased().sections)
+
+    def find_release(self, version):
+        """Gets the Release of version, or None, see changelog.versions.find_release"""
+        self.document.read()
+        return find_release(self.document.releases, version)
+
+    def get_releases_between(self, start, end):
+        """Gets the releases from start to end, see changelog.versions.releases_between"""
+        self.document.read()
+        return releases_between(self.document.releases, start, end)
+
+    def get_release_lines(self, release):
+        """Gets the lines of release, from its heading up to the next release"""
+        return self.lines[release.start:release.end]
+
+    def get_release_record(self, release):
+        """Gets the record of release, see changelog.document.release_record"""
+        return release_record(release.version, release.date, parse_sections(self.get_release_lines(release)[1:]))
+
+    @property
+    def text(self):
+        return ''.join(self.lines)
+
+    def __str__(self):
+        return self.text
+
+    def to_bytes(self, encoding='utf-8'):
+        return self.text.encode(encoding)
+
+    def write(self, changelog):
+        """Writes the changelog to a file-like object opened in text mode"""
+        changelog.write(u''.join(self.lines))
+
+    def save(self, path, encoding='utf-8'):
+        """Atomically replaces the file at path with the changelog"""
+        from changelog.files import atomic_write
+        with atomic_write(path, 'wb') as changelog:
+            changelog.write(self.to_bytes(encoding))
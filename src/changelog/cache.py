@@ -0,0 +1,144 @@
+"""
+Persistent cache of the release index parsed from a changelog.
+
+Entries are keyed on the changelog's path, mtime and size, which are checked with a single ``stat``,
+and a hash of the leading bytes the index was parsed from (the header, Unreleased block and first
+release heading). Only those leading bytes are read to validate an entry, never the release history,
+even for a complete index of every release.
+"""
+import os
+
+from changelog.document import Release, ReleaseIndex, Unreleased
+
+CACHE_ENV = 'CHANGELOG_CACHE'
+SIDECAR = '.changelog-cache'
+CACHE_VERSION = 4
+
+
+def _hash_prefix(path, length):
+    import hashlib
+    with open(path, 'rb') as changelog:
+        return hashlib.sha1(changelog.read(length)).hexdigest()
+
+
+def _prefix_size(document):
+    """Gets the number of leading bytes of document to validate its cached index by"""
+    if not document.complete or not document.releases:
+        return document.size
+    first = document.releases[0]
+    return first.offset + len(document.lines[first.start].encode('utf-8'))
+
+
+def _stat_key(stat):
+    # Python 2 has no nanosecond mtime
+    return [getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_size]
+
+
+class IndexCache(object):
+    """
+    Stores release indexes in ``directory``, or in a ``.changelog-cache`` file next to each changelog
+    if ``directory`` is None.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+
+    @classmethod
+    def from_environment(cls):
+        """
+        Gets the cache configured by $CHANGELOG_CACHE, or None if caching is disabled.
+        'sidecar' stores entries next to the changelog, 'xdg' under $XDG_CACHE_HOME,
+        and any other value is used as the cache directory.
+        """
+        setting = os.environ.get(CACHE_ENV)
+        if not setting:
+            return None
+        if setting == 'sidecar':
+            return cls()
+        if setting == 'xdg':
+            base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+            return cls(os.path.join(base, 'changelog-cli'))
+        return cls(setting)
+
+    def cache_path(self, path):
+        """Gets the file the index of the changelog at path is cached in"""
+        path = os.path.abspath(path)
+        if self.directory is None:
+            return os.path.join(os.path.dirname(path), SIDECAR)
+        import hashlib
+        name = hashlib.sha1(path.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.json')
+
+    def load(self, path):
+        """
+        Gets the cached ReleaseIndex of the changelog at path, or None if there is no valid entry
+        """
+        import json
+        try:
+            stat = os.stat(path)
+            with open(self.cache_path(path), 'r') as cache:
+                entry = json.load(cache)
+            if (entry['version'] != CACHE_VERSION or entry['path'] != os.path.abspath(path)
+                    or entry['stat'] != _stat_key(stat)
+                    or entry['hash'] != _hash_prefix(path, entry['prefix'])):
+                return None
+            return self._decode(entry)
+        except (EnvironmentError, ValueError, KeyError, TypeError):
+            return None
+
+    def store(self, path, stat, document):
+        """
+        Caches the index of document, parsed from the changelog at path while it had the given stat.
+        Failures to write the cache are ignored.
+        """
+        import binascii
+        import json
+        from changelog.files import replace_file
+        entry = {
+            'version': CACHE_VERSION,
+            'path': os.path.abspath(path),
+            'stat': _stat_key(stat),
+            'prefix': _prefix_size(document),
+            'complete': document.complete,
+            'archives': document.archives,
+            'unreleased': None,
+            'releases': [
+                [r.version, r.date, r.start, r.end, r.offset, r.end_offset] for r in document.releases
+            ],
+        }
+        unreleased = document.unreleased
+        if unreleased is not None:
+            entry['unreleased'] = {
+                'span': [unreleased.start, unreleased.end, unreleased.offset, unreleased.end_offset],
+                'sections': [[section, entries] for section, entries in unreleased.sections.items()],
+                'headings': unreleased.headings,
+            }
+        cache_path = self.cache_path(path)
+        # Unique per writer, as other processes and threads may store the same entry at once
+        temp_path = '{}.{}-{}.tmp'.format(cache_path, os.getpid(), binascii.hexlify(os.urandom(4)).decode('ascii'))
+        try:
+            entry['hash'] = _hash_prefix(path, entry['prefix'])
+            if not os.path.isdir(os.path.dirname(cache_path)):
+                os.makedirs(os.path.dirname(cache_path))
+            with open(temp_path, 'w') as cache:
+                json.dump(entry, cache)
+            replace_file(temp_path, cache_path)
+        except EnvironmentError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def _decode(entry):
+        releases = []
+        for version, date, start, end, offset, end_offset in entry['releases']:
+            release = Release(version, date, start, offset)
+            release.end, release.end_offset = end, end_offset
+            releases.append(release)
+        unreleased = None
+        if entry['unreleased'] is not None:
+            start, end, offset, end_offset = entry['unreleased']['span']
+            unreleased = Unreleased(start, offset)
+            unreleased.end, unreleased.end_offset = end, end_offset
+            unreleased.sections = {section: entries for section, entries in entry['unreleased']['sections']}
+            unreleased.headings = entry['unreleased']['headings']
+        return ReleaseIndex(unreleased, releases, complete=entry['complete'], archives=entry['archives'])
@@ -0,0 +1,138 @@
+"""
+Thin client forwarding ``cl`` invocations to a ``changelog serve`` process.
+
+Set $CHANGELOG_SERVER to the server's address to enable it. Only non-interactive invocations are
+forwarded; anything else, or any failure to reach the server, falls back to running locally.
+
+Other local users can connect to a TCP server, so requests to one carry a shared secret token:
+$CHANGELOG_SERVER_TOKEN, or the token the server generated in a file only its owner can read.
+"""
+import json
+import os
+import socket
+import sys
+
+SERVER_ENV = 'CHANGELOG_SERVER'
+TOKEN_ENV = 'CHANGELOG_SERVER_TOKEN'
+ENTRY_COMMANDS = ('new', 'change', 'fix', 'breaks')
+
+
+def default_address():
+    """Gets the address the server listens on when none is given"""
+    if not hasattr(socket, 'AF_UNIX'):
+        return '127.0.0.1:8765'
+    directory = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    return os.path.join(directory, 'changelog-cli-{}.sock'.format(os.getuid()))
+
+
+def parse_address(address):
+    """
+    Gets the socket family and address for a Unix socket path, or a TCP ``[host:]port`` on localhost
+    """
+    host, _, port = address.rpartition(':')
+    if port.isdigit() and os.sep not in address:
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+    if not hasattr(socket, 'AF_UNIX'):
+        raise ValueError("Unix sockets are not supported on this platform: {}".format(address))
+    return socket.AF_UNIX, address
+
+
+def token_path(port):
+    """Gets the file a server listening on TCP port keeps the token it generated in"""
+    return os.path.join(os.path.expanduser('~'), '.changelog-cli', '{}.token'.format(port))
+
+
+def server_token(port):
+    """
+    Gets the token for the TCP server listening on port: $CHANGELOG_SERVER_TOKEN, or the one it generated,
+    or None if there is neither
+    """
+    token = os.environ.get(TOKEN_ENV)
+    if token:
+        return token
+    try:
+        with open(token_path(port)) as token_file:
+            return token_file.read().strip()
+    except EnvironmentError:
+        return None
+
+
+def _pop_local(options):
+    """Removes a -l/--local option from options, returning its value"""
+    for i, option in enumerate(options):
+        if option in ('-l', '--local') and i + 1 < len(options):
+            local = options[i + 1]
+            del options[i:i + 2]
+            return local
+        if option.startswith('--local='):
+            del options[i]
+            return option[len('--local='):]
+    return None
+
+
+def build_request(args, path):
+    """
+    Gets the server request for command line args run against the changelog at path,
+    or None if the invocation has to run locally, e.g. because it may prompt.
+    """
+    if not args:
+        return None
+    command, options = args[0], list(args[1:])
+    request = {'command': command, 'path': path}
+    if command in ENTRY_COMMANDS:
+        if len(options) != 1 or options[0].startswith('-'):
+            return None
+        request['message'] = options[0]
+        return request
+    if command in ('current', 'view'):
+        return request if not options else None
+    request['local'] = _pop_local(options)
+    if command == 'suggest':
+        return request if not options else None
+    if command == 'release' and '--yes' in options:
+        options.remove('--yes')
+        if not options or options == ['--suggest']:
+            request['release_type'] = 'suggest'
+            return request
+    return None
+
+
+def send(request, address):
+    """Sends request to the server at address and returns its response"""
+    family, address = parse_address(address)
+    if family == socket.AF_INET:
+        request = dict(request, token=server_token(address[1]))
+    connection = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        connection.connect(address)
+        connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        stream = connection.makefile('rb')
+        try:
+            response = stream.readline()
+        finally:
+            stream.close()
+    finally:
+        connection.close()
+    return json.loads(response.decode('utf-8'))
+
+
+def forward(args, address, path='CHANGELOG.md'):
+    """
+    Runs args on the server at address, returning the exit code,
+    or None if they have to run locally instead
+    """
+    request = build_request(args, os.path.abspath(path))
+    if request is None:
+        return None
+    try:
+        response = send(request, address)
+    except (EnvironmentError, ValueError):
+        return None
+    if response.get('ok'):
+        if response.get('output'):
+            sys.stdout.write(response['output'] + '\n')
+        return 0
+    if response.get('error') == 'missing':
+        return None
+    sys.stderr.write('{}\n'.format(response.get('error')))
+    return 1
@@ -1,5 +1,9 @@
+from itertools import islice
+
 import click
 
+from changelog import trace
+from changelog.document import release_record
 from changelog.utils import ChangelogUtils
 from changelog.exceptions import ChangelogDoesNotExistError
 
@@ -8,6 +12,43 @@ LOCAL_OPTION = click.option(
     help="Prefix for local version label e.g. 'user.' for label '+user.1.0.0'."
 )
 
+FORMAT_OPTION = click.option(
+    '--format', 'output_format', type=click.Choice(['text', 'json', 'jsonl']), default='text', show_default=True,
+    help="Print plain text, or the structured release data as JSON, or as JSON lines one record at a time."
+)
+
+# Types of the section and message of a batch entry: str, or str and unicode on Python 2
+TEXT_TYPES = (str, type(u''))
+
+BATCH_SECTIONS = {
+    'new': 'new',
+    'change': 'change',
+    'fix': 'fix',
+    'break': 'break',
+    'breaks': 'break',
+}
+
+
+def echo_records(records, output_format):
+    """
+    Prints records as JSON lines, or as a JSON array with output_format 'json', each record as soon as
+    it is produced. Stops quietly if the reader goes away, so consumers may stop reading early.
+    """
+    import errno
+    import json
+    try:
+        if output_format == 'jsonl':
+            for record in records:
+                click.echo(json.dumps(record, sort_keys=True))
+            return
+        click.echo('[', nl=False)
+        for i, record in enumerate(records):
+            click.echo('{}{}'.format(', ' if i else '', json.dumps(record, sort_keys=True)), nl=False)
+        click.echo(']')
+    except IOError as error:
+        if error.errno != errno.EPIPE:
+            raise
+
 
 def print_version(ctx, _, value):
     from changelog._version import __version__ as v
@@ -19,16 +60,34 @@ def print_version(ctx, _, value):
 
 @click.group()
 @click.option('-v', '--version', is_flag=True, callback=print_version, expose_value=False, is_eager=True)
-def cli():
-    pass
+@click.option('--profile', is_flag=True,
+              help="Report the time spent in each phase and the lines and bytes read and written on stderr. "
+                   "Same as setting $CHANGELOG_TRACE.")
+@click.option('--profile-format', type=click.Choice(['table', 'json']),
+              help="Report as a table (default) or a JSON object; implies --profile.")
+@click.option('--profile-stats', type=click.Path(dir_okay=False),
+              help="Also dump cProfile stats to this file; implies --profile.")
+@click.pass_context
+def cli(ctx, profile, profile_format, profile_stats):
+    if profile or profile_format or profile_stats or trace.environment_format():
+        tracer = trace.start(profile_format)
+        if profile_stats:
+            tracer.profile(profile_stats)
+        ctx.call_on_close(lambda: trace.stop().report())
 
 
 @cli.command(help="Create CHANGELOG.md with some basic documentation")
-def init():
+@click.option('--journal', is_flag=True,
+              help="Also create a .changelog.d/ journal that new lines are added to until the next release.")
+def init(journal):
     click.echo('Initializing Changelog')
     CL = ChangelogUtils()
     outcome = CL.initialize_changelog_file()
     click.echo(outcome)
+    if journal:
+        from changelog.journal import Journal
+        Journal.for_changelog(CL.CHANGELOG).create()
+        click.echo("Created journal")
 
 
 @cli.command(help="add a line to the NEW section")
@@ -79,6 +138,45 @@ def breaks(message):
             CL.update_section('break', message)
 
 
+def read_batch_entries(stream):
+    """
+    Reads (section, message) pairs from 'section<TAB>message' or JSON '{"section": ..., "message": ...}' lines
+    """
+    import json
+    entries = []
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            if line.startswith('{'):
+                record = json.loads(line)
+                section, message = record['section'], record['message']
+            else:
+                section, message = line.split('\t', 1)
+            if not isinstance(section, TEXT_TYPES) or not isinstance(message, TEXT_TYPES):
+                raise TypeError("section and message must be strings")
+        except (ValueError, KeyError, TypeError):
+            raise click.BadParameter("line {}: expected 'section<TAB>message' or a JSON object".format(number))
+        if section not in BATCH_SECTIONS:
+            raise click.BadParameter("line {}: unknown section '{}'".format(number, section))
+        entries.append((BATCH_SECTIONS[section], message.strip()))
+    return entries
+
+
+@cli.command('add-batch', help="add many lines at once, read as 'section<TAB>message' or JSON lines from ENTRIES or stdin")
+@click.argument("entries", type=click.File('r'), default='-')
+def add_batch(entries):
+    batch = read_batch_entries(entries)
+    CL = ChangelogUtils()
+    try:
+        CL.update_sections(batch)
+    except ChangelogDoesNotExistError:
+        if click.confirm("No CHANGELOG.md Found, do you want to create one?"):
+            CL.initialize_changelog_file()
+            CL.update_sections(batch)
+
+
 @cli.command(help="cut a release and update the changelog accordingly")
 @LOCAL_OPTION
 @click.option('--patch', 'release_type', flag_value='patch')
@@ -100,38 +198,172 @@ def release(release_type, auto_confirm, local=None):
             CL.initialize_changelog_file()
 
 
+@cli.command(help="move older releases into an archive per year, e.g. CHANGELOG-2017.md, leaving a pointer to them")
+@click.option('-k', '--keep', type=click.IntRange(min=0), help="Number of most recent releases to keep.")
+@click.option('-b', '--before', help="Archive the releases older than this version.")
+def archive(keep=None, before=None):
+    if (keep is None) == (before is None):
+        raise click.UsageError("Pass either --keep or --before")
+    CL = ChangelogUtils()
+    try:
+        paths = call_with_versions(CL.archive, keep, before)
+        for path in paths:
+            click.echo("Archived releases to {}".format(path))
+        if not paths:
+            click.echo("No releases to archive")
+    except ChangelogDoesNotExistError:
+        pass
+
+
+@cli.command('merge-driver', help="merge the BASE, OURS and THEIRS versions of a changelog into OURS, as a git merge "
+                                   "driver registered with `changelog merge-driver %O %A %B`")
+@click.argument("base", type=click.Path(exists=True, dir_okay=False))
+@click.argument("ours", type=click.Path(exists=True, dir_okay=False))
+@click.argument("theirs", type=click.Path(exists=True, dir_okay=False))
+@click.pass_context
+def merge_driver(ctx, base, ours, theirs):
+    from changelog.merge import merge_files
+    if not merge_files(base, ours, theirs):
+        click.echo("Conflicting changes left in {}".format(ours), err=True)
+        ctx.exit(1)
+
+
+@cli.command(help="summarize every CHANGELOG.md under ROOTS (default: .) as JSON lines, in parallel")
+@click.argument("roots", nargs=-1, type=click.Path(exists=True, file_okay=False))
+@click.option('-j', '--workers', type=click.IntRange(min=1), help="Number of worker processes, defaults to one per CPU.")
+@LOCAL_OPTION
+def scan(roots, workers=None, local=None):
+    import json
+    from changelog.scan import scan as scan_changelogs
+    for summary in scan_changelogs(roots or ['.'], workers=workers, local=local):
+        click.echo(json.dumps(summary, sort_keys=True))
+
+
+@cli.command(help="serve commands to `cl` clients with $CHANGELOG_SERVER set to the same address")
+@click.option('-a', '--address', help="Unix socket path or [host:]port on localhost to listen on.")
+@click.option('--cache-size', type=click.IntRange(min=1), default=128, show_default=True,
+              help="Number of parsed changelogs to keep in memory.")
+@click.option('-r', '--root', 'roots', multiple=True, type=click.Path(exists=True, file_okay=False),
+              help="Only serve changelogs under this directory, may be repeated. Over TCP, defaults to the "
+                   "current directory.")
+def serve(address=None, cache_size=128, roots=()):
+    import signal
+    import sys
+    from changelog.client import default_address
+    from changelog.server import make_server
+    address = address or default_address()
+    try:
+        server = make_server(address, cache_size, roots=list(roots))
+    except EnvironmentError as error:
+        raise click.ClickException(str(error))
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    click.echo("Serving changelog commands on {}".format(address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
 @cli.command(help="returns the suggested next version based on the current logged changes")
 @LOCAL_OPTION
-def suggest(local=None):
+@FORMAT_OPTION
+def suggest(local=None, output_format='text'):
     CL = ChangelogUtils()
     try:
         new_version = CL.get_new_release_version('suggest', local=local)
-        click.echo(new_version)
+        if output_format == 'text':
+            click.echo(new_version)
+        else:
+            record = release_record(new_version, None, {})
+            record['release_type'] = CL.get_release_suggestion()
+            record['unreleased'] = CL.get_unreleased().counts
+            echo_records([record], 'jsonl')
     except ChangelogDoesNotExistError:
         pass
 
 
 @cli.command(help="returns the current application version based on the changelog")
-def current():
+@FORMAT_OPTION
+def current(output_format='text'):
+    CL = ChangelogUtils()
+    try:
+        if output_format == 'text':
+            click.echo(CL.get_current_version())
+        else:
+            echo_records([CL.get_current_record()], 'jsonl')
+    except ChangelogDoesNotExistError:
+        pass
+
+
+@cli.command(help="list every release in the changelog, newest first, as JSON lines or a JSON array")
+@click.option('--format', 'output_format', type=click.Choice(['json', 'jsonl']), default='jsonl', show_default=True,
+              help="Print a JSON array, or one JSON record per line.")
+@click.option('-n', '--limit', type=click.IntRange(min=0), help="Only list the most recent releases.")
+def releases(output_format='jsonl', limit=None):
+    CL = ChangelogUtils()
+    try:
+        echo_records(islice(CL.iter_release_records(), limit), output_format)
+    except ChangelogDoesNotExistError:
+        pass
+
+
+def echo_releases(CL, releases, output_format):
+    """Prints the notes of each release as text, separated by a blank line, or as JSON records"""
+    if output_format != 'text':
+        echo_records((CL.get_release_record(release) for release in releases), output_format)
+        return
+    for i, release in enumerate(releases):
+        if i:
+            click.echo()
+        click.echo(''.join(line.rstrip('\r\n') + '\n' for line in CL.get_release_lines(release)).rstrip())
+
+
+def call_with_versions(method, *versions):
+    """Calls method with version arguments, reporting versions that cannot be parsed as bad parameters"""
+    try:
+        return method(*versions)
+    except ValueError as error:
+        raise click.BadParameter(str(error))
+
+
+@cli.command(help="print the notes of the release of VERSION")
+@click.argument("version")
+@FORMAT_OPTION
+def show(version, output_format='text'):
     CL = ChangelogUtils()
     try:
-        version = CL.get_current_version()
-        click.echo(version)
+        release = call_with_versions(CL.find_release, version)
+        if release is None:
+            raise click.ClickException("No release {} in {}".format(version, CL.CHANGELOG))
+        echo_releases(CL, [release], 'jsonl' if output_format == 'json' else output_format)
     except ChangelogDoesNotExistError:
         pass
 
+
+@cli.command(help="print the notes of every release after the older of START and END up to the newer one")
+@click.argument("start")
+@click.argument("end")
+@FORMAT_OPTION
+def between(start, end, output_format='text'):
+    CL = ChangelogUtils()
+    try:
+        echo_releases(CL, call_with_versions(CL.get_releases_between, start, end), output_format)
+    except ChangelogDoesNotExistError:
+        pass
+
+
 @cli.command(help="view the current and unreleased portion of the changelog")
-def view():
+@FORMAT_OPTION
+def view(output_format='text'):
     CL = ChangelogUtils()
     try:
-        data = CL.get_changelog_data()
-        first = False
-        for line in data:
-            if CL.match_version(line):
-                if first:
-                    break
-                else:
-                    first = True
+        if output_format != 'text':
+            records = [CL.get_unreleased_record()] + list(islice(CL.iter_release_records(), 1))
+            echo_records(records, output_format)
+            return
+        for line in CL.get_current_lines():
             click.echo(line.strip())
 
     except ChangelogDoesNotExistError:
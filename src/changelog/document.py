@@ -0,0 +1,426 @@
+from changelog import trace
+from changelog.templates import (
+    ARCHIVE_LINE_PREFIX,
+    ARCHIVE_LINK_PATTERN,
+    RELEASE_LINE_PATTERN,
+    RELEASE_LINE_PREFIX,
+    RELEASE_LINE_REGEXES,
+    SECTIONS,
+    UNRELEASED,
+    UNRELEASED_LINE,
+)
+
+REVERSE_SECTIONS = {v: k for k, v in SECTIONS.items()}
+
+SKIPPED_LINES = ('---\n', '\n')
+
+# Headings of the level of ``## Unreleased`` and releases, any of which ends the Unreleased block
+HEADING_PREFIX = '## '
+
+
+def normalize(line):
+    """
+    Gets line as it is compared to headings and templates: without trailing whitespace, so \\r\\n line
+    endings and trailing spaces match, and ended by \\n
+    """
+    if line[-1:] == '\n' and not line[-2:-1].isspace():
+        return line
+    return line.rstrip() + '\n'
+
+
+def line_ending(line):
+    """Gets the line ending of line, e.g. \\r\\n for a changelog edited on Windows, or '' for the last line"""
+    return line[len(line.rstrip('\r\n')):]
+
+
+def with_line_ending(text, newline):
+    """Gets the lines of text, ended by \\n, ended by newline instead"""
+    return text if newline == '\n' else text.replace('\n', newline)
+
+
+_PATTERN_GROUPS = [('version_{}'.format(i), 'date_{}'.format(i)) for i in range(len(RELEASE_LINE_REGEXES))]
+
+
+def match_release_line(line):
+    """
+    Matches a line vs the release line patterns.
+    Returns a (version, date) tuple, with date None if the line has none, or None if it is not a release line.
+    """
+    if not line.startswith(RELEASE_LINE_PREFIX):
+        return None
+    match = RELEASE_LINE_PATTERN.match(line.rstrip())
+    if match is None:
+        return None
+    groups = match.groupdict()
+    for version_group, date_group in _PATTERN_GROUPS:
+        if groups[version_group] is not None:
+            return groups[version_group], groups.get(date_group)
+    return None
+
+
+def match_archive_line(line):
+    """
+    Matches a line vs the pointer line left in place of archived releases.
+    Returns the archives it links to, newest first, or None if it is not a pointer line.
+    """
+    if not line.startswith(ARCHIVE_LINE_PREFIX):
+        return None
+    return ARCHIVE_LINK_PATTERN.findall(line)
+
+
+def parse_sections(lines):
+    """
+    Gets the entries logged under each section heading in the lines of a block, in file order,
+    keyed by section like Unreleased.sections
+    """
+    sections = {}
+    section = None
+    for line in lines:
+        key = normalize(line)
+        if key in SKIPPED_LINES:
+            continue
+        if key in REVERSE_SECTIONS:
+            section = REVERSE_SECTIONS[key]
+        else:
+            sections.setdefault(section, []).append(line.strip().lstrip("* "))
+    return sections
+
+
+def release_record(version, date, sections):
+    """
+    Gets the record describing a release to tooling: its version, local version label, date and the
+    entries logged in each section. Entries outside any section heading are left out.
+    """
+    local = version.partition('+')[2] if version is not None else None
+    return {
+        'version': version,
+        'local': local or None,
+        'date': date,
+        'sections': {section: entries for section, entries in sections.items() if section is not None},
+    }
+
+
+class Release(object):
+    """
+    A released block of the changelog, from its heading up to the next release heading.
+
+    ``start``/``end`` are line indices and ``offset``/``end_offset`` are byte offsets
+    into the document, both as half-open ranges. ``path`` is set on releases found in an archive
+    of the changelog, to the archive they are in.
+    """
+    __slots__ = ('version', 'date', 'start', 'offset', 'end', 'end_offset', 'path')
+
+    def __init__(self, version, date, start, offset):
+        self.version = version
+        self.date = date
+        self.start = start
+        self.offset = offset
+        self.end = None
+        self.end_offset = None
+        self.path = None
+
+
+class Unreleased(object):
+    """
+    The ``## Unreleased`` block of the changelog and the entries logged in each of its sections.
+
+    ``sections`` maps each section to its entries in file order, newest first, and ``headings`` maps each
+    section to the byte offset just past its heading line. An empty block with no ``start`` stands in
+    for a changelog without one.
+    """
+    __slots__ = ('start', 'offset', 'end', 'end_offset', 'sections', 'headings')
+
+    def __init__(self, start, offset):
+        self.start = start
+        self.offset = offset
+        self.end = None
+        self.end_offset = None
+        self.sections = {}
+        self.headings = {}
+
+    @property
+    def counts(self):
+        """The number of entries logged in each section"""
+        return {section: len(entries) for section, entries in self.sections.items() if section is not None}
+
+    @property
+    def changes(self):
+        """The last entry logged in each section, as returned by ReleaseIndex.get_changes"""
+        return {section: entries[-1] for section, entries in self.sections.items()}
+
+    def with_entries(self, entries):
+        """
+        Returns a copy of the block with every (section, message) pair of entries added to the top of its
+        section, as ChangelogDocument.insert_entries would
+        """
+        unreleased = Unreleased(self.start, self.offset)
+        unreleased.end, unreleased.end_offset = self.end, self.end_offset
+        unreleased.headings = self.headings
+        unreleased.sections = {section: list(logged) for section, logged in self.sections.items()}
+        for section, message in entries:
+            unreleased.sections.setdefault(section, []).insert(0, message)
+        return unreleased
+
+
+class ReleaseIndex(object):
+    """
+    Where the Unreleased block and releases of a changelog are, without its lines.
+
+    ``complete`` is False when only the first releases have been indexed. ``archives`` lists the archives
+    older releases were moved to, newest first, as linked from the changelog.
+    """
+
+    def __init__(self, unreleased=None, releases=None, complete=True, archives=None):
+        self.unreleased = unreleased
+        self.releases = releases if releases is not None else []
+        self.complete = complete
+        self.archives = archives if archives is not None else []
+
+    def read(self, releases=None):
+        """Makes sure the first ``releases`` releases, or all of them, are indexed"""
+
+    def read_unreleased(self):
+        """Makes sure the Unreleased block is indexed"""
+
+    @property
+    def current_release(self):
+        """The most recent release, or None if nothing has been released"""
+        self.read(1)
+        return self.releases[0] if self.releases else None
+
+    def get_changes(self):
+        """
+        Returns the last entry logged in each section of the Unreleased block
+        """
+        self.read_unreleased()
+        if self.unreleased is None:
+            return {}
+        return self.unreleased.changes
+
+
+class ChangelogDocument(ReleaseIndex):
+    """
+    Parsed, in-memory model of a changelog built in a single pass over its lines.
+
+    Lines are consumed lazily from the source iterable, only as far as the information
+    asked for requires, so a query about the latest release never reads the history below it.
+    """
+
+    def __init__(self, lines):
+        super(ChangelogDocument, self).__init__(complete=False)
+        self.lines = []
+        self.size = 0
+        self._source = iter(lines)
+        self._section = None
+        # Line index of the pointer to the archives, which ends the last block
+        self.pointer = None
+
+    def read(self, releases=None):
+        """
+        Parses the source until the headings of the first ``releases`` releases have been read,
+        or to the end if ``releases`` is None.
+        """
+        if self._source is None or (releases is not None and len(self.releases) >= releases):
+            return
+        with trace.phase('parse'):
+            self._read(releases)
+
+    def read_unreleased(self):
+        """
+        Parses the source only until the end of the Unreleased block, i.e. the next heading of its level,
+        or the first release if there is none
+        """
+        if self._source is None or self.releases or (self.unreleased is not None and self.unreleased.end is not None):
+            return
+        with trace.phase('parse'):
+            self._read(1, until_unreleased=True)
+
+    def _read(self, releases, until_unreleased=False):
+        lines = self.lines
+        offset = self.size
+        i = len(lines)
+        ended = False
+        for line in self._source:
+            lines.append(line)
+            match = match_release_line(line)
+            archives = match_archive_line(line) if match is None else None
+            if match is not None:
+                self._close_block(i, offset)
+                self.releases.append(Release(match[0], match[1], i, offset))
+            elif archives is not None:
+                self._close_block(i, offset)
+                self.pointer = i
+                self.archives.extend(archives)
+                ended = until_unreleased
+            elif not self.releases:
+                key = normalize(line)
+                if self.unreleased is None:
+                    if key == UNRELEASED_LINE:
+                        self.unreleased = Unreleased(i, offset)
+                elif self.unreleased.end is None and key not in SKIPPED_LINES:
+                    if key in REVERSE_SECTIONS:
+                        self._section = REVERSE_SECTIONS[key]
+                        self.unreleased.headings.setdefault(self._section, offset + len(line.encode('utf-8')))
+                    elif key.startswith(HEADING_PREFIX):
+                        self._close_block(i, offset)
+                        ended = until_unreleased
+                    else:
+                        entry = line.strip().lstrip("* ")
+                        self.unreleased.sections.setdefault(self._section, []).append(entry)
+            offset += len(line.encode('utf-8'))
+            i += 1
+            if match is not None and releases is not None and len(self.releases) >= releases or ended:
+                self.size = offset
+                return
+        self.size = offset
+        self._close_block(i, offset)
+        self._source = None
+        self.complete = True
+
+    def iter_releases(self):
+        """Yields the releases, newest first, reading the source only as far as they are consumed"""
+        i = 0
+        while True:
+            # A release only ends once the heading after it has been read
+            self.read(i + 2)
+            if i >= len(self.releases):
+                return
+            yield self.releases[i]
+            i += 1
+
+    def release_sections(self, release):
+        """Gets the entries logged in each section of release, see parse_sections"""
+        return parse_sections(self.lines[release.start + 1:release.end])
+
+    def close(self):
+        """Stops reading the source, closing the file it streams from"""
+        close = getattr(self._source, 'close', None)
+        if close is not None:
+            close()
+        self._source = None
+
+    def _close_block(self, end, end_offset):
+        """Ends the block currently being parsed at line end, unless it has already ended"""
+        if self.releases:
+            block = self.releases[-1]
+        elif self.unreleased is not None:
+            block = self.unreleased
+        else:
+            return
+        if block.end is None:
+            block.end, block.end_offset = end, end_offset
+
+    @property
+    def header(self):
+        """Lines before the Unreleased block or first release"""
+        self.read(1)
+        if self.unreleased is not None:
+            return self.lines[:self.unreleased.start]
+        if self.releases:
+            return self.lines[:self.releases[0].start]
+        return self.lines
+
+    def insert_entry(self, section, message):
+        """
+        Returns the lines of the document with message added to the top of section
+        """
+        return self.insert_entries([(section, message)])
+
+    def insert_entries(self, entries):
+        """
+        Returns the lines of the document with every (section, message) pair of entries added,
+        in a single pass. Each section ends up as if its messages were inserted one at a time,
+        so the last one given is at the top.
+        """
+        self.read()
+        return list(iter_inserted_entries(self.lines, entries))
+
+    def release_lines(self, release_line, changes):
+        """
+        Returns the lines of the document with the Unreleased block turned into a release
+        headed by release_line, and a fresh Unreleased block above it.
+        Section headings with no entries in changes are dropped from the released block.
+        """
+        self.read()
+        return list(iter_release_lines(self.lines, release_line, changes))
+
+
+def iter_inserted_entries(lines, entries):
+    """
+    Streams lines with every (section, message) pair of entries added under the first heading
+    of its section, see ChangelogDocument.insert_entries. Raises ValueError once lines are
+    exhausted if a heading was never found.
+    """
+    pending = {}
+    for section, message in entries:
+        pending.setdefault(SECTIONS[section], []).append("* {}\n".format(message))
+    return _insert_pending(lines, pending)
+
+
+def _insert_pending(lines, pending):
+    for line in lines:
+        yield line
+        key = normalize(line)
+        if key in pending:
+            # Entries take the line ending of their heading
+            newline = line_ending(line)
+            if not newline:
+                newline = '\n'
+                yield newline
+            for entry in reversed(pending.pop(key)):
+                yield with_line_ending(entry, newline)
+    if pending:
+        raise ValueError("Section headings not found: {}".format(
+            ", ".join(sorted(heading.strip() for heading in pending))
+        ))
+
+
+def iter_release_lines(lines, release_line, changes):
+    """
+    Streams lines with the Unreleased block turned into a release, see ChangelogDocument.release_lines.
+    Only the lines above the Unreleased block are held back, as the fresh Unreleased block goes
+    to the top of the file when there is none. The lines written take the line ending of the first line.
+    """
+    held = []
+    releasing = True
+    newline = None
+    for line in lines:
+        if newline is None:
+            newline = line_ending(line) or '\n'
+            unreleased = with_line_ending(UNRELEASED, newline)
+        key = normalize(line)
+        if releasing and match_release_line(line) is not None:
+            releasing = False
+        if releasing and key in REVERSE_SECTIONS and REVERSE_SECTIONS[key] not in changes:
+            continue
+        if held is None:
+            yield line
+        elif key == UNRELEASED_LINE and releasing:
+            for previous in held:
+                yield previous
+            held = None
+            yield unreleased
+            yield with_line_ending(release_line, newline)
+        elif not releasing:
+            yield unreleased
+            for previous in held:
+                yield previous
+            held = None
+            yield line
+        else:
+            held.append(line)
+    if held is not None:
+        yield with_line_ending(UNRELEASED, newline or '\n')
+        for previous in held:
+            yield previous
+
+
+def iter_crunched_lines(lines):
+    """Streams lines without the triplicate blank lines that would make the changelog grow too long"""
+    before_last = last = None
+    for line in lines:
+        key = normalize(line)
+        if key == "\n" and last == "\n" and before_last in ("\n", "---\n"):
+            continue
+        before_last, last = last, key
+        yield line
@@ -1,2 +1,6 @@
 class ChangelogDoesNotExistError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class ChangelogLockTimeoutError(Exception):
+    pass
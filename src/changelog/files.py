@@ -0,0 +1,261 @@
+"""
+Safe file operations for changing a changelog that other processes may be changing too
+
+shutil, tempfile and mmap are only imported by the operations that need them, as these run
+on the path of every ``cl new``.
+"""
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from changelog import trace
+from changelog.exceptions import ChangelogLockTimeoutError
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+_thread_locks = weakref.WeakValueDictionary()
+_thread_locks_guard = threading.Lock()
+
+
+def lock_path(path):
+    """Gets the lock file guarding the file at path, or the file it links to"""
+    directory, name = os.path.split(os.path.realpath(path))
+    return os.path.join(directory, '.{}.lock'.format(name))
+
+
+def thread_lock(path):
+    """
+    Gets the in-process lock shared by every FileLock on the file at path, so threads queue on it
+    instead of polling for the lock file
+    """
+    path = lock_path(path)
+    with _thread_locks_guard:
+        lock = _thread_locks.get(path)
+        if lock is None:
+            lock = _thread_locks[path] = threading.Lock()
+        return lock
+
+
+def _acquire_thread_lock(lock, timeout, interval):
+    """
+    Takes lock, waiting up to timeout seconds, and returns whether it was taken. Locks cannot wait with
+    a timeout on Python 2, so there they are retried every interval seconds instead.
+    """
+    try:
+        return lock.acquire(True, timeout)
+    except TypeError:
+        pass
+    deadline = time.time() + timeout
+    while not lock.acquire(False):
+        if time.time() >= deadline:
+            return False
+        time.sleep(interval)
+    return True
+
+
+class FileLock(object):
+    """
+    Advisory, exclusive lock on a file, held through a ``.<name>.lock`` file next to it, removed again
+    on release unless another process on Windows has it open. Waits up to ``timeout`` seconds for other holders, retrying every ``interval`` seconds.
+    Threads of one process first take the path's thread_lock, so only one of them at a time waits
+    for the lock file.
+    """
+
+    def __init__(self, path, timeout=10.0, interval=0.05):
+        self.path = lock_path(path)
+        self.timeout = timeout
+        self.interval = interval
+        self._fd = None
+        self._thread_lock = thread_lock(path)
+
+    def _timed_out(self):
+        return ChangelogLockTimeoutError("Timed out after {}s waiting for {}".format(self.timeout, self.path))
+
+    def acquire(self):
+        deadline = time.time() + self.timeout
+        if not _acquire_thread_lock(self._thread_lock, self.timeout, self.interval):
+            raise self._timed_out()
+        try:
+            self._acquire_file(deadline)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def _acquire_file(self, deadline):
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            except EnvironmentError:
+                os.close(fd)
+                if time.time() >= deadline:
+                    raise self._timed_out()
+                time.sleep(self.interval)
+                continue
+            # The previous holder may have removed the lock file after we opened it
+            if fcntl is not None and not _same_file(fd, self.path):
+                os.close(fd)
+                continue
+            self._fd = fd
+            return
+
+    def release(self):
+        try:
+            if fcntl is not None:
+                # Remove before unlocking so waiters holding the old file retry with a new one
+                os.remove(self.path)
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            os.close(self._fd)
+            self._fd = None
+            if fcntl is None:
+                # Windows only removes files nobody has open, so waiters never hold a removed one
+                try:
+                    os.remove(self.path)
+                except EnvironmentError:
+                    pass
+        finally:
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *_):
+        self.release()
+
+
+def _same_file(fd, path):
+    try:
+        return os.fstat(fd).st_ino == os.stat(path).st_ino
+    except EnvironmentError:
+        return False
+
+
+def _fsync_directory(directory):
+    if os.name != 'posix':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def replace_file(source, target):
+    """
+    Renames source to target, replacing it if it exists, like os.replace. Python 2 has no os.replace,
+    and on Windows its os.rename fails if target exists, so target is removed first there.
+    """
+    if hasattr(os, 'replace'):
+        os.replace(source, target)
+        return
+    if os.name == 'nt' and os.path.exists(target):
+        os.remove(target)
+    os.rename(source, target)
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    """
+    Opens a temporary file to write the new contents of path to. On success it is flushed to disk
+    and replaces path, so readers only ever see the old or the new file, never a partial one.
+    If path is a symbolic link, the file it links to is replaced instead.
+    """
+    import shutil
+    import tempfile
+    path = os.path.realpath(path)
+    directory, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.{}.'.format(name), suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as temp:
+            yield temp
+            temp.flush()
+            os.fsync(temp.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        else:
+            os.chmod(temp_path, 0o644)
+        replace_file(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    _fsync_directory(directory)
+
+
+def copy_bytes(source, target, start, end=None):
+    """
+    Appends bytes start to end (default: the end of file) of the open binary file source to target,
+    with os.sendfile so they never pass through Python where the platform allows it
+    """
+    if end is None:
+        end = os.fstat(source.fileno()).st_size
+    count = end - start
+    trace.count('bytes read', count)
+    trace.count('bytes written', count)
+    target.flush()
+    if hasattr(os, 'sendfile'):
+        try:
+            while count > 0:
+                sent = os.sendfile(target.fileno(), source.fileno(), start, count)
+                if not sent:
+                    break
+                start += sent
+                count -= sent
+        except OSError:
+            pass  # e.g. macOS only sends to sockets
+    source.seek(start)
+    while count > 0:
+        chunk = source.read(min(count, COPY_BUFFER_SIZE))
+        if not chunk:
+            break
+        target.write(chunk)
+        count -= len(chunk)
+
+
+def splice_bytes(source, target, offset, data):
+    """Copies the open binary file source to target with data inserted at offset"""
+    copy_bytes(source, target, 0, offset)
+    target.write(data)
+    trace.count('bytes written', len(data))
+    copy_bytes(source, target, offset)
+
+
+def insert_bytes(changelog, offset, data):
+    """
+    Inserts data at offset in the open binary file, shifting only the bytes after offset.
+    Memory maps the file to move them where possible, otherwise seeks and rewrites the tail.
+    """
+    import mmap
+    changelog.seek(0, os.SEEK_END)
+    size = changelog.tell()
+    trace.count('bytes read', size - offset)
+    trace.count('bytes written', size - offset + len(data))
+    changelog.truncate(size + len(data))
+    try:
+        mapped = mmap.mmap(changelog.fileno(), 0)
+    except (EnvironmentError, ValueError):
+        changelog.seek(offset)
+        tail = changelog.read(size - offset)
+        changelog.seek(offset)
+        changelog.write(data + tail)
+        return
+    try:
+        mapped.move(offset + len(data), offset, size - offset)
+        mapped[offset:offset + len(data)] = data
+        mapped.flush()
+    finally:
+        mapped.close()
@@ -0,0 +1,79 @@
+"""
+Append-only journal of changelog entries, kept as one small file per entry in a ``.changelog.d``
+directory next to the changelog.
+
+Adding an entry never reads, locks or rewrites the changelog, and entries added on different branches
+never conflict in git. Entries are merged into the Unreleased block when it is read, and compacted
+into the changelog when a release is cut. Journal mode is on whenever the directory exists.
+"""
+import binascii
+import os
+import time
+
+from changelog.templates import SECTIONS
+
+JOURNAL_DIRECTORY = '.changelog.d'
+
+
+class Journal(object):
+    def __init__(self, directory):
+        self.directory = directory
+
+    @classmethod
+    def for_changelog(cls, path):
+        """Gets the journal belonging to the changelog at path"""
+        return cls(os.path.join(os.path.dirname(os.path.abspath(path)), JOURNAL_DIRECTORY))
+
+    @property
+    def enabled(self):
+        return os.path.isdir(self.directory)
+
+    def create(self):
+        """Creates the journal directory, turning journal mode on"""
+        if not self.enabled:
+            os.makedirs(self.directory)
+        open(os.path.join(self.directory, '.gitkeep'), 'a').close()
+
+    def append(self, section, message):
+        """
+        Records message for section in a new entry file, named so that entries sort in the order
+        they were added. Returns the entry's name.
+        """
+        if section not in SECTIONS:
+            raise KeyError(section)
+        name = '{:017d}-{}-{}.{}'.format(
+            int(time.time() * 1000000), os.getpid(), binascii.hexlify(os.urandom(4)).decode('ascii'), section
+        )
+        temp_path = os.path.join(self.directory, '.{}.tmp'.format(name))
+        with open(temp_path, 'wb') as entry:
+            entry.write(message.encode('utf-8'))
+        os.rename(temp_path, os.path.join(self.directory, name))
+        return name
+
+    def names(self):
+        """Gets the names of the recorded entries, oldest first"""
+        if not self.enabled:
+            return []
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if not name.startswith('.') and os.path.splitext(name)[1][1:] in SECTIONS
+        )
+
+    def read(self, names=None):
+        """Gets the (section, message) pairs of the named entries, or of all of them, oldest first"""
+        entries = []
+        for name in self.names() if names is None else names:
+            try:
+                with open(os.path.join(self.directory, name), 'rb') as entry:
+                    message = entry.read().decode('utf-8').strip()
+            except EnvironmentError:
+                continue  # compacted by a release since it was listed
+            entries.append((os.path.splitext(name)[1][1:], message))
+        return entries
+
+    def remove(self, names):
+        """Removes the named entries once they have been compacted into the changelog"""
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,48 @@
+"""
+Console script entry point.
+
+Logging a single line with ``new``, ``change``, ``fix`` or ``breaks`` is by far the most common
+invocation (e.g. from git hooks), so it is handled without importing click or packaging.
+Anything else, including a missing changelog, is passed on to the click command group.
+
+With $CHANGELOG_SERVER set, invocations are first offered to a running ``changelog serve``,
+unless they are being profiled with ``--profile`` (or the ``--profile-*`` options implying it) or
+$CHANGELOG_TRACE.
+"""
+import os
+import sys
+
+FAST_COMMANDS = {
+    'new': 'new',
+    'change': 'change',
+    'fix': 'fix',
+    'breaks': 'break',
+}
+
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else argv
+    from changelog import trace
+    if trace.environment_format() or any(arg.startswith('--profile') for arg in args):
+        # Started before anything else is imported so the import phase is measured
+        trace.start()
+    elif os.environ.get('CHANGELOG_SERVER'):
+        from changelog.client import forward
+        code = forward(args, os.environ['CHANGELOG_SERVER'])
+        if code is not None:
+            return code
+    if len(args) == 2 and args[0] in FAST_COMMANDS and not args[1].startswith('-'):
+        with trace.phase('import'):
+            from changelog.exceptions import ChangelogDoesNotExistError
+            from changelog.utils import ChangelogUtils
+        try:
+            ChangelogUtils().update_section(FAST_COMMANDS[args[0]], args[1])
+        except ChangelogDoesNotExistError:
+            pass
+        else:
+            if trace.active():
+                trace.stop().report()
+            return
+    with trace.phase('import'):
+        from changelog.commands import cli
+    cli(args=args)
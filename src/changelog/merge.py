@@ -0,0 +1,148 @@
+"""
+Section-aware three-way merge of changelogs, run by git as a merge driver::
+
+    git config merge.changelog.driver "changelog merge-driver %O %A %B"
+    echo "CHANGELOG.md merge=changelog" >> .gitattributes
+
+Branches logging changes at the same time all add lines under the same section headings of the
+Unreleased block, which git's line merge reports as conflicts. Here Unreleased blocks are merged
+section by section instead: entries added on either branch are kept, the other branch's on top, and
+entries removed on either branch, e.g. by cutting a release, are dropped. The lines above the block and
+the release history below it must only have changed on one branch, and are kept byte for byte.
+
+Each changelog is parsed once and entries are matched through sets, so merging takes linear time.
+"""
+from changelog.document import SKIPPED_LINES, ChangelogDocument, line_ending, normalize, with_line_ending
+from changelog.templates import UNRELEASED_LINE
+from changelog.utils import ChangelogUtils
+
+CONFLICT_MARKER_SIZE = 7
+
+
+def split_changelog(lines):
+    """
+    Splits the lines of a changelog into the lines above its Unreleased block, the block and the lines
+    below it, or returns None if it has no Unreleased block
+    """
+    document = ChangelogDocument(lines)
+    document.read()
+    unreleased = document.unreleased
+    if unreleased is None:
+        return None
+    lines = document.lines
+    return lines[:unreleased.start], lines[unreleased.start:unreleased.end], lines[unreleased.end:]
+
+
+def iter_block_lines(block):
+    """
+    Yields each line of an Unreleased block with its section and, for entries, its normalized line.
+    The ``## Unreleased`` line heads the entries outside any section, under None, and headings other than
+    those of ChangelogUtils.SECTIONS, e.g. ``### Security``, head a section named by their normalized line.
+    """
+    section = None
+    for line in block:
+        key = normalize(line)
+        if key in ChangelogUtils.REVERSE_SECTIONS:
+            section = ChangelogUtils.REVERSE_SECTIONS[key]
+            yield line, section, None
+        elif key.startswith('#') and key != UNRELEASED_LINE:
+            section = key
+            yield line, section, None
+        elif key in SKIPPED_LINES or key.startswith('#'):
+            yield line, section, None
+        else:
+            yield line, section, key
+
+
+def block_entries(block):
+    """Gets the (section, normalized line) pair of every entry of an Unreleased block"""
+    return set((section, key) for _, section, key in iter_block_lines(block) if key is not None)
+
+
+def merge_chunk(base, ours, theirs):
+    """
+    Merges lines changed as a whole: the side that changed them wins. Returns the merged lines and whether
+    they merged cleanly, with both sides between conflict markers otherwise.
+    """
+    if ours == theirs or theirs == base:
+        return ours, True
+    if ours == base:
+        return theirs, True
+    return conflict_lines(ours, theirs), False
+
+
+def conflict_lines(ours, theirs):
+    """Gets both sides of a conflict between git's conflict markers"""
+    lines = ['<' * CONFLICT_MARKER_SIZE + ' ours\n']
+    for side, marker in ((ours, '='), (theirs, '>')):
+        lines.extend(side)
+        if side and not line_ending(side[-1]):
+            lines.append('\n')
+        lines.append(marker * CONFLICT_MARKER_SIZE + (' theirs\n' if marker == '>' else '\n'))
+    return lines
+
+
+def merge_unreleased(base, ours, theirs):
+    """
+    Merges the lines of three Unreleased blocks section by section, keeping the lines of ours with the
+    entries theirs added at the top of their sections and those theirs removed left out. Added entries take
+    the line ending of the heading they go under. Returns None if theirs added entries to a section that
+    ours has no heading for, including sections under a heading theirs added.
+    """
+    if ours == base or ours == theirs:
+        return theirs
+    if theirs == base:
+        return ours
+    base_entries, our_entries = block_entries(base), block_entries(ours)
+    removed = base_entries - block_entries(theirs)
+    added = {}
+    for _, section, key in iter_block_lines(theirs):
+        if key is not None and (section, key) not in base_entries and (section, key) not in our_entries:
+            added.setdefault(section, []).append(key)
+    merged = []
+    for i, (line, section, key) in enumerate(iter_block_lines(ours)):
+        if key is not None and (section, key) in removed:
+            continue
+        merged.append(line)
+        if key is None and section in added and (i == 0 or section is not None):
+            newline = line_ending(line)
+            if not newline:
+                newline = '\n'
+                merged.append(newline)
+            merged.extend(with_line_ending(entry, newline) for entry in added.pop(section))
+    return merged if not added else None
+
+
+def merge(base, ours, theirs):
+    """
+    Merges the lines of the base, our and their version of a changelog. Returns the merged lines and
+    whether they merged cleanly, with conflict markers around the lines that did not otherwise.
+    """
+    parts = [split_changelog(lines) for lines in (base, ours, theirs)]
+    if None in parts:
+        return merge_chunk(base, ours, theirs)
+    heads, blocks, tails = zip(*parts)
+    head, head_clean = merge_chunk(*heads)
+    block = merge_unreleased(*blocks)
+    block_clean = block is not None
+    if not block_clean:
+        block = conflict_lines(blocks[1], blocks[2])
+    tail, tail_clean = merge_chunk(*tails)
+    return head + block + tail, head_clean and block_clean and tail_clean
+
+
+def merge_files(base, ours, theirs):
+    """
+    Merges the changelogs at paths base, ours and theirs into ours, as git expects of a merge driver.
+    Line endings are kept as they are. Returns whether they merged cleanly.
+    """
+    import io
+    from changelog.files import atomic_write
+    versions = []
+    for path in (base, ours, theirs):
+        with io.open(path, 'r', encoding='utf-8', newline='') as changelog:
+            versions.append(changelog.readlines())
+    lines, clean = merge(*versions)
+    with atomic_write(ours, 'wb') as changelog:
+        changelog.writelines(line.encode('utf-8') for line in lines)
+    return clean
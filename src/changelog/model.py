@@ -0,0 +1,277 @@
+"""
+Compact, read-only model of a whole changelog, for tools holding many of them in memory at once.
+
+A CompactChangelog keeps the changelog as its encoded bytes, and each entry as the offsets of its text
+in them, so no string is built per line and release versions are only parsed when asked for.
+Entries and their text are made on access. ``python benchmarks/bench_model.py`` compares its memory
+use with the list of lines of ChangelogDocument.
+"""
+import re
+import sys
+from array import array
+
+from changelog.document import HEADING_PREFIX, match_release_line, release_record
+from changelog.templates import SECTIONS, UNRELEASED_LINE
+from changelog.versions import find_release, parse_version, releases_between
+
+_NEWLINE = re.compile(b'\n')
+# re cannot search a memoryview on Python 2.7
+_SEARCHABLE_VIEWS = sys.version_info[0] >= 3
+
+SKIPPED_LINES = (b'---', b'')
+SECTION_NAMES = (None,) + tuple(sorted(SECTIONS))
+_HEADING_CODES = {
+    heading.rstrip('\n').encode('utf-8'): SECTION_NAMES.index(section) for section, heading in SECTIONS.items()
+}
+
+
+class _Immutable(object):
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+
+class Entry(_Immutable):
+    """An entry of a section, as the span of its text in the changelog's buffer"""
+    __slots__ = ('buffer', 'start', 'end')
+
+    def __init__(self, buffer, start, end):
+        super(Entry, self).__init__(buffer=buffer, start=start, end=end)
+
+    @property
+    def text(self):
+        return _bytes(self.buffer[self.start:self.end]).decode('utf-8')
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return "Entry({!r})".format(self.text)
+
+
+class Section(_Immutable):
+    """
+    The entries logged under a section heading of a block, in file order. ``bounds`` holds the start and
+    end offset of every entry of the changelog, the section's being those from ``first`` to ``last``.
+    Entries outside any section heading are gathered in a section named None.
+    """
+    __slots__ = ('name', 'buffer', 'bounds', 'first', 'last')
+
+    def __init__(self, name, buffer, bounds, first, last):
+        super(Section, self).__init__(name=name, buffer=buffer, bounds=bounds, first=first, last=last)
+
+    def __len__(self):
+        return self.last - self.first
+
+    def __iter__(self):
+        bounds = self.bounds
+        for i in range(self.first, self.last):
+            yield Entry(self.buffer, bounds[2 * i], bounds[2 * i + 1])
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    @property
+    def texts(self):
+        """The text of every entry"""
+        return [entry.text for entry in self]
+
+    def __repr__(self):
+        return "Section({!r}, {} entries)".format(self.name, len(self))
+
+
+class Release(_Immutable):
+    """
+    A block of the changelog: the Unreleased block, with no version or date, or a release.
+    ``start`` and ``end`` are the byte offsets of the block in the changelog's buffer.
+    """
+    __slots__ = ('version', 'date', 'buffer', 'start', 'end', 'sections')
+
+    def __init__(self, version, date, buffer, start, end, sections):
+        super(Release, self).__init__(
+            version=version, date=date, buffer=buffer, start=start, end=end, sections=sections,
+        )
+
+    @property
+    def parsed_version(self):
+        """The Version of the release, parsed on first use and shared with every other release of it"""
+        return parse_version(self.version) if self.version is not None else None
+
+    def section(self, name):
+        """Gets the section called name, or None if the block has no entries in it"""
+        for section in self.sections:
+            if section.name == name:
+                return section
+        return None
+
+    @property
+    def counts(self):
+        """The number of entries logged in each section"""
+        return {section.name: len(section) for section in self.sections if section.name is not None}
+
+    @property
+    def text(self):
+        """The lines of the block, from its heading up to the next block"""
+        return _bytes(self.buffer[self.start:self.end]).decode('utf-8')
+
+    def record(self):
+        """Gets the record of the block, see changelog.document.release_record"""
+        return release_record(self.version, self.date, {section.name: section.texts for section in self.sections})
+
+    def __repr__(self):
+        return "Release({!r}, {!r})".format(self.version, self.date)
+
+
+class CompactChangelog(_Immutable):
+    """
+    A whole changelog parsed from its encoded bytes, with lines ending in \\n or \\r\\n. The buffer may be
+    any bytes-like object, e.g. bytes, a memoryview or an mmap of the file, and is used without copying,
+    except for a memoryview on Python 2.7, which is copied while parsing.
+
+    Only the buffer and three arrays of offsets are held: the span and sections of each block, the
+    section name and entries of each section, and the span of each entry. Release, Section and Entry
+    objects are views built on access, and versions and dates are read from the headings as needed.
+    """
+    __slots__ = ('buffer', '_blocks', '_sections', '_bounds', '_has_unreleased')
+
+    def __init__(self, buffer):
+        blocks, sections, bounds, has_unreleased = _parse(buffer)
+        super(CompactChangelog, self).__init__(
+            buffer=buffer, _blocks=blocks, _sections=sections, _bounds=bounds, _has_unreleased=has_unreleased,
+        )
+
+    @classmethod
+    def from_path(cls, path):
+        """Reads and parses the changelog at path"""
+        with open(path, 'rb') as changelog:
+            return cls(changelog.read())
+
+    def _block(self, index):
+        buffer = self.buffer
+        start, end, first, last = self._blocks[4 * index:4 * index + 4]
+        if index == 0 and self._has_unreleased:
+            version = date = None
+        else:
+            heading = _bytes(buffer[start:_find_newline(buffer, start, end)]).decode('utf-8')
+            version, date = match_release_line(heading.rstrip() + '\n')
+        sections = self._sections
+        return Release(version, date, buffer, start, end, tuple(
+            Section(SECTION_NAMES[sections[3 * i]], buffer, self._bounds, sections[3 * i + 1], sections[3 * i + 2])
+            for i in range(first, last)
+        ))
+
+    @property
+    def unreleased(self):
+        """The Unreleased block, or None if the changelog has none"""
+        return self._block(0) if self._has_unreleased else None
+
+    def iter_releases(self):
+        """Yields the releases, newest first"""
+        for index in range(1 if self._has_unreleased else 0, len(self._blocks) // 4):
+            yield self._block(index)
+
+    @property
+    def releases(self):
+        """The releases, newest first"""
+        return tuple(self.iter_releases())
+
+    @property
+    def current_release(self):
+        """The most recent release, or None if nothing has been released"""
+        for release in self.iter_releases():
+            return release
+        return None
+
+    def find_release(self, version):
+        """Gets the Release of version, or None, see changelog.versions.find_release"""
+        return find_release(self.releases, version)
+
+    def get_releases_between(self, start, end):
+        """Gets the releases from start to end, see changelog.versions.releases_between"""
+        return releases_between(self.releases, start, end)
+
+
+def _parse(buffer):
+    """
+    Indexes the blocks of a changelog like ChangelogDocument does: the Unreleased block ends at the next
+    heading of its level, and releases at the next release. Only headings are decoded.
+    """
+    size = len(buffer)
+    typecode = 'I' if size < 2 ** 32 else 'Q'
+    blocks, sections, bounds = array(typecode), array(typecode), array(typecode)
+    has_unreleased = False
+    # Entry offsets of each section of the block being parsed, by section code, or None outside blocks
+    spans = None
+    start = section = 0
+    for offset, line in _iter_lines(buffer):
+        # Trailing whitespace, \r of \r\n line endings included, is ignored like by normalize
+        content = line.rstrip()
+        if line.startswith(b'#'):
+            if spans is not None and content in _HEADING_CODES:
+                section = _HEADING_CODES[content]
+                continue
+            heading = content.decode('utf-8') + '\n'
+            match = match_release_line(heading)
+            ends_unreleased = has_unreleased and len(blocks) == 0 and heading.startswith(HEADING_PREFIX)
+            if match is not None or (spans is not None and ends_unreleased):
+                if spans is not None:
+                    _close_block(blocks, sections, bounds, start, offset, spans)
+                spans = {} if match is not None else None
+                start, section = offset, 0
+                continue
+            if not has_unreleased and spans is None and not blocks and heading == UNRELEASED_LINE:
+                has_unreleased = True
+                spans = {}
+                start, section = offset, 0
+                continue
+        if spans is not None and content not in SKIPPED_LINES:
+            # The same text as ``line.strip().lstrip("* ")``, as a suffix of the stripped line
+            text = content.strip().lstrip(b'* ')
+            end = offset + len(content)
+            spans.setdefault(section, []).extend((end - len(text), end))
+    if spans is not None:
+        _close_block(blocks, sections, bounds, start, size, spans)
+    return blocks, sections, bounds, has_unreleased
+
+
+def _iter_lines(buffer):
+    """Yields the offset and bytes of every line of buffer"""
+    offset = 0
+    searchable = buffer if _SEARCHABLE_VIEWS or not isinstance(buffer, memoryview) else buffer.tobytes()
+    for newline in _NEWLINE.finditer(searchable):
+        end = newline.end()
+        yield offset, _bytes(buffer[offset:end])
+        offset = end
+    if offset < len(buffer):
+        yield offset, _bytes(buffer[offset:])
+
+
+def _find_newline(buffer, start, end):
+    """Gets the offset of the first newline of buffer from start to end, or end if there is none"""
+    if not _SEARCHABLE_VIEWS and isinstance(buffer, memoryview):
+        newline = _NEWLINE.search(buffer[start:end].tobytes())
+        return end if newline is None else start + newline.start()
+    newline = _NEWLINE.search(buffer, start, end)
+    return end if newline is None else newline.start()
+
+
+def _bytes(view):
+    """Gets a slice of a buffer as bytes, which bytes() of a memoryview is not on Python 2.7"""
+    return view.tobytes() if isinstance(view, memoryview) else bytes(view)
+
+
+def _close_block(blocks, sections, bounds, start, end, spans):
+    first = len(sections) // 3
+    for code, offsets in spans.items():
+        entry = len(bounds) // 2
+        bounds.extend(offsets)
+        sections.extend((code, entry, entry + len(offsets) // 2))
+    blocks.extend((start, end, first, len(sections) // 3))
@@ -0,0 +1,60 @@
+"""
+Summarize many changelogs at once, in parallel across a pool of worker processes
+"""
+import os
+from functools import partial
+
+from changelog.utils import ChangelogUtils
+
+SKIPPED_DIRECTORIES = ('node_modules',)
+
+
+def find_changelogs(roots, name=ChangelogUtils.CHANGELOG):
+    """
+    Yields the path of every changelog under roots, skipping hidden directories such as .git
+    """
+    for root in roots:
+        for directory, directories, files in os.walk(root):
+            directories[:] = sorted(
+                d for d in directories if not d.startswith('.') and d not in SKIPPED_DIRECTORIES
+            )
+            if name in files:
+                yield os.path.join(directory, name)
+
+
+def summarize(path, local=None):
+    """
+    Gets the current version, suggested next version and number of unreleased entries per section
+    of the changelog at path, or the error that prevented it
+    """
+    try:
+        CL = ChangelogUtils(path)
+        return {
+            'path': path,
+            'current': str(CL.get_current_version()),
+            'suggest': CL.get_new_release_version('suggest', local=local),
+            'unreleased': CL.get_unreleased().counts,
+        }
+    except Exception as error:  # pylint: disable=broad-except
+        return {'path': path, 'error': '{}: {}'.format(type(error).__name__, error)}
+
+
+def scan(roots, workers=None, local=None):
+    """
+    Yields the summary of every changelog under roots, in the order they complete.
+    Runs in this process if workers is 1, otherwise in a pool of workers processes (default: one per CPU).
+    """
+    paths = find_changelogs(roots)
+    task = partial(summarize, local=local)
+    if workers == 1:
+        for path in paths:
+            yield task(path)
+        return
+    from multiprocessing import Pool
+    pool = Pool(workers)
+    try:
+        for summary in pool.imap_unordered(task, paths, chunksize=8):
+            yield summary
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,217 @@
+"""
+Long-running server answering changelog commands for ``cl`` clients, see changelog.client.
+
+Requests and responses are JSON objects, one per line. Parsed changelogs are kept in an LRU cache
+and revalidated with a ``stat`` on every request. Requests are handled one at a time, so commands
+against the same changelog never interleave.
+
+A Unix socket only accepts connections from its owner, but any local user can connect to a TCP port.
+Over TCP, requests must carry the server's token, and only changelogs under the served roots (by
+default the directory the server was started in) are answered.
+"""
+import hmac
+import json
+import os
+import socket
+from collections import OrderedDict
+
+from changelog.client import TOKEN_ENV, parse_address, token_path
+from changelog.exceptions import ChangelogDoesNotExistError
+from changelog.utils import ChangelogUtils
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+ENTRY_SECTIONS = {
+    'new': 'new',
+    'change': 'change',
+    'fix': 'fix',
+    'breaks': 'break',
+}
+
+
+class ChangelogCache(object):
+    """
+    LRU cache of ChangelogUtils by changelog path, dropping entries whose file has changed
+    """
+
+    def __init__(self, size=128):
+        self.size = size
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _stat_key(path):
+        try:
+            stat = os.stat(path)
+        except EnvironmentError:
+            return None
+        # Python 2 has no nanosecond mtime
+        return stat.st_ino, getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_size
+
+    def get(self, path):
+        """Gets the ChangelogUtils for path, reusing its parsed document if the file is unchanged"""
+        key = self._stat_key(path)
+        entry = self._entries.pop(path, None)
+        if entry is None or entry[0] != key:
+            entry = (key, ChangelogUtils(path))
+        self._entries[path] = entry
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        return entry[1]
+
+    def refresh(self, path):
+        """Records the current stat of path after the server itself changed it"""
+        if path in self._entries:
+            self._entries[path] = (self._stat_key(path), self._entries[path][1])
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def is_under(path, roots):
+    """Checks whether path is inside any of the directories roots, symbolic links resolved"""
+    path = os.path.realpath(path)
+    return any(path.startswith(os.path.join(root, '')) for root in roots)
+
+
+def handle_request(request, cache, token=None, roots=None):
+    """
+    Runs a single request against the cached changelogs and returns the response. If token is given,
+    the request must carry it, and if roots is given its changelog must be under one of them.
+    """
+    command = request.get('command')
+    path = request.get('path')
+    if token is not None and not hmac.compare_digest(
+            u'{}'.format(request.get('token')).encode('utf-8'), token.encode('utf-8')):
+        return {'ok': False, 'error': "Invalid token"}
+    if not path:
+        return {'ok': False, 'error': "Missing changelog path"}
+    if roots is not None and not is_under(path, roots):
+        return {'ok': False, 'error': "Not under a served root: {}".format(path)}
+    CL = cache.get(path)
+    try:
+        return _run_command(CL, command, request, cache, path)
+    finally:
+        _close_source(CL)
+
+
+def _run_command(CL, command, request, cache, path):
+    output = None
+    try:
+        if command in ENTRY_SECTIONS:
+            CL.update_section(ENTRY_SECTIONS[command], request['message'])
+            cache.refresh(path)
+        elif command == 'current':
+            output = str(CL.get_current_version())
+        elif command == 'suggest':
+            output = CL.get_new_release_version('suggest', local=request.get('local'))
+        elif command == 'release':
+            if CL.get_unreleased().start is None:
+                return {'ok': False, 'error': "No Unreleased block in {}".format(path)}
+            CL.cut_release(request.get('release_type', 'suggest'), local=request.get('local'))
+            cache.refresh(path)
+        elif command == 'view':
+            output = '\n'.join(line.strip() for line in CL.get_current_lines())
+        else:
+            return {'ok': False, 'error': "Unknown command: {}".format(command)}
+    except ChangelogDoesNotExistError:
+        return {'ok': False, 'error': 'missing'}
+    except Exception as error:  # pylint: disable=broad-except
+        return {'ok': False, 'error': '{}: {}'.format(type(error).__name__, error)}
+    return {'ok': True, 'output': output}
+
+
+def _close_source(CL):
+    """
+    Reads the rest of the document CL has parsed so far, so its file is closed while it waits in the cache,
+    as Windows cannot replace a file another process has open. A document that fails to read is dropped.
+    """
+    document = CL._document  # pylint: disable=protected-access
+    if document is None:
+        return
+    try:
+        document.read()
+    except Exception:  # pylint: disable=broad-except
+        CL._discard_document()  # pylint: disable=protected-access
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError:
+                response = {'ok': False, 'error': "Invalid request"}
+            else:
+                response = handle_request(request, self.server.cache, self.server.token, self.server.roots)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class TCPServer(socketserver.TCPServer):
+    allow_reuse_address = True
+    token_path = None
+
+    def write_token(self):
+        """Generates the token clients must send, in a file only the owner of the server can read"""
+        import binascii
+        token = binascii.hexlify(os.urandom(16)).decode('ascii')
+        self.token_path = token_path(self.server_address[1])
+        directory = os.path.dirname(self.token_path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        fd = os.open(self.token_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as token_file:
+            token_file.write(token)
+        return token
+
+    def server_close(self):
+        socketserver.TCPServer.server_close(self)
+        if self.token_path is not None and os.path.exists(self.token_path):
+            os.remove(self.token_path)
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class UnixServer(socketserver.UnixStreamServer):
+        def server_bind(self):
+            # Only the owner may talk to the server; a stale socket from a dead server is replaced
+            if os.path.exists(self.server_address):
+                probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    probe.connect(self.server_address)
+                except EnvironmentError:
+                    os.remove(self.server_address)
+                else:
+                    raise EnvironmentError("A server is already listening on {}".format(self.server_address))
+                finally:
+                    probe.close()
+            umask = os.umask(0o177)
+            try:
+                socketserver.UnixStreamServer.server_bind(self)
+            finally:
+                os.umask(umask)
+
+        def server_close(self):
+            socketserver.UnixStreamServer.server_close(self)
+            if os.path.exists(self.server_address):
+                os.remove(self.server_address)
+
+
+def make_server(address, cache_size=128, roots=None):
+    """
+    Creates a server listening on address, a Unix socket path or a TCP ``[host:]port``, for the changelogs
+    under the directories roots. Over TCP, roots default to the current directory, and clients must send
+    $CHANGELOG_SERVER_TOKEN, or else a token the server generates.
+    """
+    family, address = parse_address(address)
+    server_class = TCPServer if family == socket.AF_INET else UnixServer
+    server = server_class(address, RequestHandler)
+    server.cache = ChangelogCache(cache_size)
+    server.token = None
+    if family == socket.AF_INET:
+        server.token = os.environ.get(TOKEN_ENV) or server.write_token()
+        roots = roots or [os.getcwd()]
+    server.roots = [os.path.realpath(root) for root in roots] if roots else None
+    return server
@@ -1,3 +1,5 @@
+import re
+
 BASE = """# CHANGELOG
 
 All notable changes to this project will be documented in this file.
@@ -21,6 +23,15 @@ UNRELEASED = """
 
 INIT = BASE + UNRELEASED
 
+UNRELEASED_LINE = "## Unreleased\n"
+
+SECTIONS = {
+    'new': "### New\n",
+    'fix': "### Fixes\n",
+    'change': '### Changes\n',
+    'break': "### Breaks\n"
+}
+
 DEFAULT_VERSION = "0.0.0"
 
 RELEASE_LINE = "## {0} - ({1})\n"
@@ -41,3 +52,26 @@ RELEASE_LINE_REGEXES = [
         r"^##\s\[{full_version}\]\s\-\s{date}$",
     ]
 ]
+
+
+def _suffix_group_names(regex, suffix):
+    """Renames the named groups in regex so several patterns can share one alternation"""
+    return re.sub(r'\(\?P<(\w+)>', r'(?P<\g<1>_{}>'.format(suffix), regex)
+
+
+# Single compiled alternation of RELEASE_LINE_REGEXES, tried in the same order.
+# Groups are suffixed with the index of their pattern, e.g. version_0, date_2.
+RELEASE_LINE_PATTERN = re.compile('|'.join(
+    '(?:{})'.format(_suffix_group_names(regex, i))
+    for i, regex in enumerate(RELEASE_LINE_REGEXES)
+))
+RELEASE_LINE_PREFIX = '##'
+
+# Older releases moved out of the changelog go to an archive per year of release next to it, e.g. CHANGELOG-2017.md,
+# listed on a pointer line left in their place
+ARCHIVE_NAME = "{root}-{year}{ext}"
+ARCHIVE_HEADER = "# {title} ({year})\n\nReleases of {year} archived from [{name}]({name}).\n\n"
+ARCHIVE_LINE_PREFIX = "Older releases are archived in "
+ARCHIVE_LINE = ARCHIVE_LINE_PREFIX + "{0}.\n"
+ARCHIVE_LINK = "[{0}]({0})"
+ARCHIVE_LINK_PATTERN = re.compile(r'\[[^\]]*\]\(([^)\s]+)\)')
@@ -0,0 +1,185 @@
+"""
+Opt-in timing of where a command spends its time, enabled with ``--profile`` or $CHANGELOG_TRACE.
+
+Time is attributed to the innermost phase running, so nested phases are not counted twice, and the
+streaming stages of a rewrite (read, mutate, crunch, write) are each timed as their lines are pulled,
+a batch at a time to keep the overhead of tracing out of the timings. Lines read from the changelog
+are pulled one at a time, so commands still stop reading where they would untraced.
+The report goes to stderr as a table, or as a JSON object with ``--profile-format json`` or
+``CHANGELOG_TRACE=json``. When tracing is off every hook is a no-op.
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+TRACE_ENV = 'CHANGELOG_TRACE'
+PHASES = ('import', 'read', 'parse', 'match', 'mutate', 'crunch', 'write')
+COUNTERS = ('lines read', 'bytes read', 'lines written', 'bytes written')
+BATCH_SIZE = 1024
+
+clock = getattr(time, 'perf_counter', time.time)
+
+_tracer = None
+
+
+class Tracer(object):
+    def __init__(self, format='table'):
+        self.format = format
+        self.started = clock()
+        self.phases = {}
+        self.counters = {}
+        self.profiler = None
+        self.stats_path = None
+        self._stack = []
+        self._switched = self.started
+
+    def _charge(self):
+        """Charges the time since the last phase switch to the innermost running phase"""
+        now = clock()
+        if self._stack:
+            name = self._stack[-1]
+            self.phases[name] = self.phases.get(name, 0.0) + now - self._switched
+        self._switched = now
+
+    def enter(self, name):
+        self._charge()
+        self._stack.append(name)
+
+    def exit(self):
+        self._charge()
+        self._stack.pop()
+
+    def count(self, name, amount):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def profile(self, path):
+        """Also runs cProfile from now on, dumping its stats to path when the report is written"""
+        import cProfile
+        self.stats_path = path
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def summary(self):
+        total = clock() - self.started
+        phases = [(name, self.phases[name]) for name in PHASES if name in self.phases]
+        phases += sorted((name, value) for name, value in self.phases.items() if name not in PHASES)
+        phases.append(('other', total - sum(value for _, value in phases)))
+        counters = [(name, self.counters.get(name, 0)) for name in COUNTERS]
+        return phases, total, counters
+
+    def report(self, stream=None):
+        """Writes the timings and counters to stream, stderr by default"""
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.stats_path)
+        stream = sys.stderr if stream is None else stream
+        phases, total, counters = self.summary()
+        if self.format == 'json':
+            import json
+            stream.write(u'{}\n'.format(json.dumps({
+                'phases': dict(phases),
+                'total': total,
+                'counters': dict(counters),
+            }, sort_keys=True)))
+            return
+        for name, value in phases + [('total', total)]:
+            stream.write(u"{:<14} {:>10.2f} ms\n".format(name, value * 1000))
+        for name, value in counters:
+            stream.write(u"{:<14} {:>10d}\n".format(name, value))
+        if self.stats_path is not None:
+            stream.write(u"cProfile stats written to {}\n".format(self.stats_path))
+
+
+def start(format=None):
+    """Starts tracing, unless it already is, and returns the tracer"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(format or environment_format() or 'table')
+    elif format is not None:
+        _tracer.format = format
+    return _tracer
+
+
+def stop():
+    """Stops tracing and returns the tracer, or None if tracing was off"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def active():
+    return _tracer is not None
+
+
+def environment_format():
+    """Gets the report format asked for by $CHANGELOG_TRACE, or None if it is not set"""
+    value = os.environ.get(TRACE_ENV)
+    if not value:
+        return None
+    return 'json' if value.lower() == 'json' else 'table'
+
+
+@contextmanager
+def phase(name):
+    """Attributes the time spent in the block to phase name"""
+    if _tracer is None:
+        yield
+        return
+    tracer = _tracer
+    tracer.enter(name)
+    try:
+        yield
+    finally:
+        tracer.exit()
+
+
+def count(name, amount):
+    if _tracer is not None:
+        _tracer.count(name, amount)
+
+
+def iterate(name, iterable):
+    """Attributes the time spent producing the items of iterable to phase name"""
+    if _tracer is None:
+        return iterable
+    return _traced(_tracer, name, iter(iterable))
+
+
+def reading(lines):
+    """Times lines as read from the changelog, counting them and their bytes"""
+    if _tracer is None:
+        return lines
+    # Not batched, as reading ahead would read more of the file than the command needs
+    return _traced(_tracer, 'read', iter(lines), 'lines read', 'bytes read', batch_size=1)
+
+
+def writing(lines):
+    """Counts lines and their bytes as written to the changelog"""
+    if _tracer is None:
+        return lines
+    return _traced(_tracer, None, iter(lines), 'lines written', 'bytes written')
+
+
+def _traced(tracer, name, iterator, lines=None, size=None, batch_size=BATCH_SIZE):
+    try:
+        while True:
+            if name is not None:
+                tracer.enter(name)
+            try:
+                batch = list(islice(iterator, batch_size))
+            finally:
+                if name is not None:
+                    tracer.exit()
+            if not batch:
+                return
+            if lines is not None:
+                tracer.count(lines, len(batch))
+                tracer.count(size, sum(len(item.encode('utf-8')) for item in batch))
+            for item in batch:
+                yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
@@ -1,29 +1,103 @@
+import io
 import os
-import re
-from datetime import date
-
-from packaging.version import Version
+import threading
+from contextlib import contextmanager
 
+from changelog import trace
+from changelog.cache import IndexCache
+from changelog.document import (
+    ChangelogDocument,
+    Unreleased,
+    iter_crunched_lines,
+    iter_inserted_entries,
+    iter_release_lines,
+    line_ending,
+    match_release_line,
+    normalize,
+    parse_sections,
+    release_record,
+    with_line_ending,
+)
 from changelog.exceptions import ChangelogDoesNotExistError
+from changelog.files import FileLock, atomic_write, copy_bytes, insert_bytes, splice_bytes
+from changelog.journal import Journal
 from changelog.templates import (
+    ARCHIVE_HEADER,
+    ARCHIVE_LINE,
+    ARCHIVE_LINK,
+    ARCHIVE_NAME,
     DEFAULT_VERSION,
     INIT,
     RELEASE_LINE,
-    RELEASE_LINE_REGEXES,
-    UNRELEASED,
-    VERSION_REGEX,
+    SECTIONS,
+)
+from changelog.versions import (
+    RELEASE_TYPES,
+    bump_version,
+    find_release,
+    new_release_version,
+    parse_version,
+    releases_between,
+    suggest_release_type,
 )
 
 
-class ChangelogUtils:
+def _stream_lines(path):
+    # Line endings are kept as they are, so offsets are byte exact and rewrites preserve them
+    with io.open(path, 'r', encoding='utf-8', newline='') as changelog:
+        for line in changelog:
+            yield line
+
+
+def _block_lines(lines, newline):
+    """Gets lines ended by a blank line, so another block can follow them"""
+    lines = list(lines)
+    if lines and not line_ending(lines[-1]):
+        lines[-1] += newline
+    if lines and normalize(lines[-1]) != '\n':
+        lines.append(newline)
+    return lines
+
+
+class ChangelogUtils(object):
     CHANGELOG = 'CHANGELOG.md'
-    SECTIONS = {
-        'new': "### New\n",
-        'fix': "### Fixes\n",
-        'change': '### Changes\n',
-        'break': "### Breaks\n"
-    }
+    SECTIONS = SECTIONS
     REVERSE_SECTIONS = {v: k for k, v in SECTIONS.items()}
+    # Seconds to wait for other writers, overridden by $CHANGELOG_LOCK_TIMEOUT, and between retries
+    LOCK_TIMEOUT = 10.0
+    LOCK_RETRY_INTERVAL = 0.05
+    # Replace the changelog with a fully written temporary file rather than shifting bytes in place
+    ATOMIC_WRITES = True
+
+    def __init__(self, path=None):
+        if path is not None:
+            self.CHANGELOG = path
+        # The parsed document, cached index and held lock are per thread, so threads can share an instance
+        self._local = threading.local()
+
+    @property
+    def _document(self):
+        return getattr(self._local, 'document', None)
+
+    @_document.setter
+    def _document(self, document):
+        self._local.document = document
+
+    @property
+    def _index(self):
+        return getattr(self._local, 'index', None)
+
+    @_index.setter
+    def _index(self, index):
+        self._local.index = index
+
+    @property
+    def _lock(self):
+        return getattr(self._local, 'lock', None)
+
+    @_lock.setter
+    def _lock(self, lock):
+        self._local.lock = lock
 
     def initialize_changelog_file(self):
         """
@@ -39,153 +113,472 @@ class ChangelogUtils:
         """
         Gets all of the lines from the current changelog
         """
+        return list(self.iter_changelog_lines())
+
+    def iter_changelog_lines(self):
+        """
+        Gets an iterator streaming the lines of the current changelog.
+        The file is only read as far as the iterator is consumed.
+        """
         if not os.path.isfile(self.CHANGELOG):
             raise ChangelogDoesNotExistError
-        with open(self.CHANGELOG, 'r') as changelog:
-            data = changelog.readlines()
-        return data
+        return trace.reading(_stream_lines(self.CHANGELOG))
+
+    def get_document(self):
+        """
+        Gets the parsed changelog, streaming the file only as far as it has been queried
+        """
+        if self._document is None:
+            self._document = ChangelogDocument(self.iter_changelog_lines())
+        return self._document
+
+    def get_index(self):
+        """
+        Gets the release index of the changelog. With $CHANGELOG_CACHE set, it is answered from
+        the parse cache while the file is unchanged, and cached after parsing otherwise.
+        """
+        if self._document is not None:
+            return self._document
+        if self._index is not None:
+            return self._index
+        cache = IndexCache.from_environment()
+        if cache is None:
+            return self.get_document()
+        index = cache.load(self.CHANGELOG)
+        if index is not None:
+            self._index = index
+            return index
+        document = self.get_document()
+        stat = os.stat(self.CHANGELOG)
+        document.read(1)
+        cache.store(self.CHANGELOG, stat, document)
+        return document
+
+    def get_release_index(self):
+        """
+        Gets the index of every release and its byte range in the changelog. With $CHANGELOG_CACHE set,
+        it is answered from the parse cache while the file is unchanged, and cached after parsing otherwise.
+        """
+        if self._document is None and self._index is not None and self._index.complete:
+            return self._index
+        cache = IndexCache.from_environment() if self._document is None else None
+        if cache is not None:
+            index = cache.load(self.CHANGELOG)
+            if index is not None and index.complete:
+                self._index = index
+                return index
+        document = self.get_document()
+        stat = os.stat(self.CHANGELOG)
+        document.read()
+        if cache is not None:
+            cache.store(self.CHANGELOG, stat, document)
+        return document
+
+    def get_archives(self):
+        """
+        Gets a ChangelogUtils for each archive older releases were moved to, newest first, as linked
+        from the changelog. Archives that no longer exist are left out.
+        """
+        directory = os.path.dirname(self.CHANGELOG)
+        paths = [os.path.join(directory, name) for name in self.get_release_index().archives]
+        return [type(self)(path) for path in paths if os.path.isfile(path)]
+
+    def iter_archived_releases(self):
+        """Yields the releases of every archive, newest first, each with the path of its archive"""
+        for archive in self.get_archives():
+            for release in archive.get_release_index().releases:
+                release.path = archive.CHANGELOG
+                yield release
+
+    def find_release(self, version):
+        """
+        Gets the release of version from the release index, or None if there is none.
+        Versions are compared as versions, so '1.0' finds a '1.0.0' release.
+        The archives are only read for releases that are not in the changelog.
+        """
+        release = find_release(self.get_release_index().releases, version)
+        if release is None:
+            release = find_release(list(self.iter_archived_releases()), version)
+        return release
+
+    def get_releases_between(self, start, end):
+        """
+        Gets the releases after the older of versions start and end, up to and including the newer one,
+        in changelog order, i.e. the releases deployed when going from one version to the other.
+        The archives are only read if the oldest release in the changelog is newer than both versions.
+        """
+        releases = self.get_release_index().releases
+        low = min(parse_version(start), parse_version(end))
+        if not releases or parse_version(releases[-1].version) > low:
+            releases = releases + list(self.iter_archived_releases())
+        return releases_between(releases, start, end)
+
+    def get_release_lines(self, release):
+        """
+        Gets the lines of release, from its heading up to the next release, read straight from its byte
+        range in the changelog, or in its archive. Falls back on parsing the whole changelog if the
+        range does not hold the release, e.g. because it changed since it was indexed.
+        """
+        if release.path is not None and release.path != self.CHANGELOG:
+            return type(self)(release.path).get_release_lines(release)
+        with trace.phase('read'), open(self.CHANGELOG, 'rb') as changelog:
+            changelog.seek(release.offset)
+            data = changelog.read(release.end_offset - release.offset)
+        trace.count('bytes read', len(data))
+        lines = data.decode('utf-8').splitlines(True)
+        match = match_release_line(lines[0]) if lines else None
+        if match is not None and match[0] == release.version:
+            return lines
+        document = self.get_document()
+        document.read()
+        for candidate in document.releases:
+            if candidate.version == release.version:
+                return document.lines[candidate.start:candidate.end]
+        return []
+
+    def get_release_record(self, release):
+        """Gets the record of release, see release_record"""
+        return release_record(release.version, release.date, parse_sections(self.get_release_lines(release)[1:]))
+
+    def _discard_document(self):
+        self._index = None
+        if self._document is not None:
+            self._document.close()
+            self._document = None
+
+    @contextmanager
+    def locked(self):
+        """
+        Holds the changelog's lock for a read-modify-write, so concurrent writers cannot lose each
+        other's changes. Anything read before the lock was taken is discarded. Reentrant within a
+        thread; other threads wait for it like other processes do, even when sharing the instance.
+        """
+        if self._lock is not None:
+            yield
+            return
+        timeout = float(os.environ.get('CHANGELOG_LOCK_TIMEOUT') or self.LOCK_TIMEOUT)
+        self._lock = FileLock(self.CHANGELOG, timeout, self.LOCK_RETRY_INTERVAL)
+        try:
+            with self._lock:
+                self._discard_document()
+                yield
+        finally:
+            self._lock = None
+            self._discard_document()
 
     def write_changelog(self, line_list):
         """
         writes the lines out to the changelog
         """
-        with open(self.CHANGELOG, 'w') as changelog:
-            changelog.writelines(line_list)
+        with self.locked(), trace.phase('write'):
+            self._discard_document()
+            with atomic_write(self.CHANGELOG, 'wb') as changelog:
+                changelog.writelines(line.encode('utf-8') for line in trace.writing(line_list))
+
+    def get_journal(self):
+        """Gets the entry journal of the changelog, or None if journal mode is off"""
+        journal = Journal.for_changelog(self.CHANGELOG)
+        return journal if journal.enabled else None
+
+    def get_journal_entries(self):
+        """Gets the (section, message) pairs waiting in the journal, oldest first"""
+        journal = self.get_journal()
+        return journal.read() if journal is not None else []
 
     def update_section(self, section, message):
         """Updates a section of the changelog with message"""
-        data = self.get_changelog_data()
-        i = data.index(self.SECTIONS[section]) + 1
-        data.insert(i, "* {}\n".format(message))
-        self.write_changelog(data)
+        journal = self.get_journal()
+        if journal is not None:
+            journal.append(section, message)
+            return
+        with self.locked():
+            if not self.insert_line_in_place(section, "* {}\n".format(message)):
+                self.write_changelog(self.iter_inserted_lines([(section, message)]))
+
+    def update_sections(self, entries):
+        """Updates the sections of the changelog with every (section, message) pair of entries at once"""
+        if not entries:
+            return
+        journal = self.get_journal()
+        if journal is not None:
+            for section, message in entries:
+                journal.append(section, message)
+            return
+        with self.locked():
+            self.write_changelog(self.iter_inserted_lines(entries))
+
+    def iter_inserted_lines(self, entries):
+        """Streams the lines of the changelog with every (section, message) pair of entries added"""
+        return trace.iterate('mutate', iter_inserted_entries(self.iter_changelog_lines(), entries))
+
+    def insert_line_in_place(self, section, line):
+        """
+        Inserts line under the heading of section in the Unreleased block without parsing
+        the rest of the file: its bytes are copied to a replacement file, or shifted in place
+        if ATOMIC_WRITES is off. Returns False without writing if the heading cannot be located
+        in the file, in which case the whole changelog has to be rewritten instead.
+        """
+        with self.locked():
+            document = self.get_document()
+            document.read(1)
+            headings = document.unreleased.headings if document.unreleased is not None else {}
+            if section not in headings:
+                return False
+            offset = headings[section]
+            heading = next(
+                candidate for candidate in document.lines[document.unreleased.start:]
+                if normalize(candidate) == self.SECTIONS[section]
+            ).encode('utf-8')
+            with open(self.CHANGELOG, 'rb') as changelog:
+                changelog.seek(offset - len(heading))
+                if changelog.read(len(heading)) != heading or not heading.endswith(b'\n'):
+                    return False
+            # Release the partially read stream before the file changes underneath it
+            self._discard_document()
+            data = with_line_ending(line, line_ending(heading.decode('utf-8'))).encode('utf-8')
+            with trace.phase('write'):
+                if self.ATOMIC_WRITES:
+                    # The changelog is closed again before it is replaced, as Windows cannot replace open files
+                    with atomic_write(self.CHANGELOG, 'wb') as replacement:
+                        with open(self.CHANGELOG, 'rb') as changelog:
+                            splice_bytes(changelog, replacement, offset, data)
+                else:
+                    with open(self.CHANGELOG, 'r+b') as changelog:
+                        insert_bytes(changelog, offset, data)
+            return True
+
+    def get_current_release(self):
+        """
+        Gets the most recent release, from the newest archive if every release has been archived,
+        or None if nothing has been released
+        """
+        release = self.get_index().current_release
+        if release is None:
+            for release in self.iter_archived_releases():
+                break
+        return release
 
     def get_current_version(self):
         """Gets the Current Application Version Based on Changelog"""
-        data = self.get_changelog_data()
-        for line in data:
-            version = self.match_version(line)
-            if version is not None:
-                return version
-        return Version(DEFAULT_VERSION)
+        release = self.get_current_release()
+        if release is not None:
+            return parse_version(release.version)
+        return parse_version(DEFAULT_VERSION)
+
+    def get_current_lines(self):
+        """
+        Gets the lines of the changelog up to the end of the current release, which is read from the newest
+        archive if every release has been archived
+        """
+        document = self.get_document()
+        document.read(2)
+        end = document.releases[1].start if len(document.releases) > 1 else len(document.lines)
+        lines = document.lines[:end]
+        if len(document.releases) < 2 and document.pointer is not None:
+            lines = document.lines[:document.pointer]
+            if not document.releases:
+                release = self.get_current_release()
+                lines = lines + (self.get_release_lines(release) if release is not None else [])
+        entries = self.get_journal_entries()
+        if entries:
+            return ChangelogDocument(lines).insert_entries(entries)
+        return lines
+
+    def iter_release_records(self):
+        """
+        Yields the record of each release, newest first, see release_record. The archives are only read
+        once the releases in the changelog have all been consumed.
+        """
+        document = self.get_document()
+        for release in document.iter_releases():
+            yield release_record(release.version, release.date, document.release_sections(release))
+        for archive in self.get_archives():
+            for record in archive.iter_release_records():
+                yield record
+
+    def get_current_record(self):
+        """Gets the record of the current release, or of the default version if nothing has been released"""
+        for record in self.iter_release_records():
+            return record
+        return release_record(DEFAULT_VERSION, None, {})
+
+    def get_unreleased(self):
+        """
+        Gets the Unreleased block, with the entries and counts of every section, journal entries included
+        at the top. Only the Unreleased block is read, or nothing while the parse cache is warm.
+        """
+        index = self.get_index()
+        index.read_unreleased()
+        unreleased = index.unreleased if index.unreleased is not None else Unreleased(None, None)
+        entries = self.get_journal_entries()
+        return unreleased.with_entries(entries) if entries else unreleased
+
+    def get_unreleased_record(self):
+        """Gets the record of the Unreleased block, journal entries included, with no version or date"""
+        return release_record(None, None, self.get_unreleased().sections)
 
     def get_changes(self):
         """Get the list of chances since the last release"""
-        data = self.get_changelog_data()
-        changes = {}
-        reading = False
-        section = None
-        for line in data:
-            if line in ['---\n', '\n']:
-                continue
-            if self.match_version(line):
-                break
-            if reading:
-                if line in self.REVERSE_SECTIONS:
-                    section = self.REVERSE_SECTIONS[line]
-                    continue
-                else:
-                    changes[section] = line.strip().lstrip("* ")
-                    continue
-            if line == "## Unreleased\n":
-                reading = True
-                continue
-
-        return changes
+        return self.get_unreleased().changes
 
     def get_release_suggestion(self):
         """Suggests a release type"""
-        changes = self.get_changes()
-        if 'break' in changes:
-            return "major"
-        elif 'new' in changes:
-            return "minor"
-        return "patch"
+        return suggest_release_type(self.get_changes())
 
     def get_new_release_version(self, release_type, local=None):
         """
         Returns the version of the new release
         """
         current = self.get_current_version()
-        if release_type not in ['major', 'minor', 'patch']:
+        if release_type not in RELEASE_TYPES:
             release_type = self.get_release_suggestion()
+        return new_release_version(current, release_type, local=local)
 
-        version = DEFAULT_VERSION if local else current.base_version
-        version_in_local = False
+    def cut_release(self, release_type="suggest", local=None):
+        """
+        Cuts a release and updates changelog.
+        Only the lines above the previous release are parsed and rebuilt, the history below
+        is copied over byte for byte.
+        """
+        with trace.phase('import'):
+            from datetime import date
+        with self.locked():
+            journal = self.get_journal()
+            names = journal.names() if journal is not None else []
+            new_version = self.get_new_release_version(release_type, local=local)
+            changes = self.get_changes()
+            release_line = RELEASE_LINE.format(new_version, date.today().isoformat())
+            entries = journal.read(names) if names else []
+            document = self.get_document()
+            previous = document.current_release
+            if previous is not None:
+                head = self.iter_release_lines(document.lines[:previous.start], release_line, changes, entries)
+                written = self._write_head(head, document, previous)
+            if previous is None or not written:
+                self.write_changelog(
+                    self.iter_release_lines(self.iter_changelog_lines(), release_line, changes, entries)
+                )
+            if names:
+                journal.remove(names)
 
-        if local and current.local and local in current.local:
-            version_in_local = re.search(VERSION_REGEX, current.local)
-            if version_in_local:
-                version = version_in_local.group()
+    def iter_release_lines(self, lines, release_line, changes, entries=()):
+        """
+        Streams the lines of a changelog turned into the release headed by release_line, with
+        entries added first, so only the lines above the Unreleased block are ever held in memory
+        """
+        if entries:
+            lines = trace.iterate('mutate', iter_inserted_entries(lines, entries))
+        lines = trace.iterate('mutate', iter_release_lines(lines, release_line, changes))
+        return trace.iterate('crunch', iter_crunched_lines(lines))
 
-        new_version = self.bump_version(version, release_type)
-        if local:
-            if version_in_local:
-                new_local = re.sub(VERSION_REGEX, new_version, current.local)
-            else:
-                new_local = local + new_version
-            new_version = '+'.join([current.base_version, new_local])
+    def _write_head(self, head, document, release):
+        """
+        Replaces everything above release with the lines of head, copying the bytes from release
+        onwards unchanged. Returns False without writing if release cannot be located in the file.
+        """
+        heading = document.lines[release.start].encode('utf-8')
+        with open(self.CHANGELOG, 'rb') as changelog:
+            changelog.seek(release.offset)
+            if changelog.read(len(heading)) != heading:
+                return False
+        self._discard_document()
+        # The changelog is closed again before it is replaced, as Windows cannot replace open files
+        with trace.phase('write'), atomic_write(self.CHANGELOG, 'wb') as replacement:
+            replacement.writelines(line.encode('utf-8') for line in trace.writing(head))
+            with open(self.CHANGELOG, 'rb') as changelog:
+                copy_bytes(changelog, replacement, release.offset)
+        return True
 
-        return new_version
+    def archive(self, keep=None, before=None):
+        """
+        Moves the releases below the newest keep releases, or those older than version before, into an
+        archive per year of release next to the changelog, e.g. CHANGELOG-2017.md, and links to the
+        archives from a pointer line in their place. Archives are written before the changelog, and
+        releases already in an archive are not added again, so an interrupted archive can be rerun.
+        Returns the paths of the archives written.
+        """
+        with self.locked():
+            document = self.get_document()
+            document.read()
+            releases = document.releases
+            if before is not None:
+                oldest = parse_version(before)
+                keep = next(
+                    (i for i, release in enumerate(releases) if parse_version(release.version) < oldest),
+                    len(releases)
+                )
+            moved = releases[keep:]
+            if not moved:
+                return []
+            newline = line_ending(document.lines[0]) or '\n'
+            root, ext = os.path.splitext(os.path.basename(self.CHANGELOG))
+            years = {}
+            year = next((release.date[:4] for release in moved if release.date), 'undated')
+            for release in moved:
+                # Releases without a date are kept with the release above them
+                year = release.date[:4] if release.date else year
+                years.setdefault(year, []).append(release)
+            names = []
+            for year in sorted(years, reverse=True):
+                name = ARCHIVE_NAME.format(root=root, year=year, ext=ext)
+                lines = []
+                for release in years[year]:
+                    lines.extend(_block_lines(document.lines[release.start:release.end], newline))
+                header = ARCHIVE_HEADER.format(title=root, year=year, name=os.path.basename(self.CHANGELOG))
+                self._write_archive(os.path.join(os.path.dirname(self.CHANGELOG), name), lines, header, newline)
+                names.append(name)
+            pointer = document.pointer if document.pointer is not None else len(document.lines)
+            links = names + [name for name in document.archives if name not in names]
+            head = _block_lines(document.lines[:moved[0].start], newline)
+            line = ARCHIVE_LINE.format(', '.join(ARCHIVE_LINK.format(link) for link in links))
+            self.write_changelog(head + [with_line_ending(line, newline)] + document.lines[pointer + 1:])
+            directory = os.path.dirname(self.CHANGELOG)
+            return [os.path.join(directory, name) for name in names]
 
-    def cut_release(self, release_type="suggest", local=None):
-        """Cuts a release and updates changelog"""
-        new_version = self.get_new_release_version(release_type, local=local)
-        changes = self.get_changes()
-        data = self.get_changelog_data()
-        output = []
-        unreleased_position = 0
-        reading = True
-        for i, line in enumerate(data):
-            if self.match_version(line):
-                reading = False
-            if line == "## Unreleased\n":
-                unreleased_position = i
-                line = RELEASE_LINE.format(new_version, date.today().isoformat())
-            if reading and line in self.REVERSE_SECTIONS and self.REVERSE_SECTIONS[line] not in changes:
-                continue
-            output.append(line)
-        output.insert(unreleased_position, UNRELEASED)
-        output = self.crunch_lines(output)
-        self.write_changelog(output)
+    def _write_archive(self, path, lines, header, newline):
+        """
+        Adds the lines of archived releases to the top of the archive at path, after its header, leaving out
+        the releases it already holds
+        """
+        archive = type(self)(path)
+        with archive.locked():
+            if os.path.isfile(path):
+                document = archive.get_document()
+                document.read()
+                start = document.releases[0].start if document.releases else len(document.lines)
+                archived = set(release.version for release in document.releases)
+                head, tail = document.lines[:start], document.lines[start:]
+            else:
+                archived = set()
+                head, tail = [with_line_ending(header, newline)], []
+            added = []
+            skipping = False
+            for line in lines:
+                match = match_release_line(line)
+                if match is not None:
+                    skipping = match[0] in archived
+                if not skipping:
+                    added.append(line)
+            archive.write_changelog(head + added + tail)
 
     def crunch_lines(self, line_list):
         """
         Removes triplicate blank lines from changelog to prevent it from getting too long
         """
-        i = 2
-        while i < len(line_list):
-            here = line_list[i]
-            minus_1 = line_list[i - 1]
-            minus_2 = line_list[i - 2]
-            if here == minus_1 == minus_2 == "\n":
-                line_list.pop(i)
-            elif minus_2 == '---\n' and here == minus_1 == '\n':
-                line_list.pop(i)
-            else:
-                i += 1
-        return line_list
+        with trace.phase('crunch'):
+            return list(iter_crunched_lines(line_list))
 
     def bump_version(self, version, release_type):
         """
         Bumps a version number based on release_type
         """
-        x, y, z = version.split(".")
-        if release_type == "major":
-            x = int(x) + 1
-            y = z = 0
-        elif release_type == "minor":
-            y = int(y) + 1
-            z = 0
-        else:
-            z = int(z) + 1
-        return "{}.{}.{}".format(x, y, z)
+        return bump_version(version, release_type)
 
     def match_version(self, line):
         """
         Matches a line vs the list of version strings.
         Returns matched groups dictionary or None.
         """
-        for regex in RELEASE_LINE_REGEXES:
-            match = re.match(regex, line)
-            if match:
-                return Version(match.group('version'))
+        match = match_release_line(line)
+        if match is not None:
+            return parse_version(match[0])
@@ -0,0 +1,124 @@
+"""
+Version arithmetic shared by the file-backed ChangelogUtils and the in-memory Changelog.
+
+packaging is only imported the first time a version is parsed.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from changelog import trace
+from changelog.templates import DEFAULT_VERSION, VERSION_REGEX
+
+RELEASE_TYPES = ('major', 'minor', 'patch')
+# Number of parsed versions kept, least recently used first, so long-running processes stay bounded
+VERSION_CACHE_SIZE = 1024
+
+_VERSIONS = OrderedDict()
+_VERSIONS_LOCK = threading.Lock()
+
+
+def parse_version(version):
+    """
+    Returns the Version for a version string, reusing the instance from a recent call.
+    packaging is only imported the first time a version is needed.
+    """
+    with _VERSIONS_LOCK:
+        parsed = _VERSIONS.pop(version, None)
+        if parsed is not None:
+            _VERSIONS[version] = parsed
+            return parsed
+    with trace.phase('import'):
+        from packaging.version import Version
+    with trace.phase('match'):
+        parsed = Version(version)
+    with _VERSIONS_LOCK:
+        parsed = _VERSIONS.setdefault(version, parsed)
+        while len(_VERSIONS) > VERSION_CACHE_SIZE:
+            _VERSIONS.popitem(last=False)
+    return parsed
+
+
+def _parse_version_or_none(version):
+    try:
+        return parse_version(version)
+    except ValueError:
+        return None
+
+
+def bump_version(version, release_type):
+    """
+    Bumps a version number based on release_type
+    """
+    x, y, z = version.split(".")
+    if release_type == "major":
+        x = int(x) + 1
+        y = z = 0
+    elif release_type == "minor":
+        y = int(y) + 1
+        z = 0
+    else:
+        z = int(z) + 1
+    return "{}.{}.{}".format(x, y, z)
+
+
+def suggest_release_type(changes):
+    """Suggests a release type for the last entry logged in each section"""
+    if 'break' in changes:
+        return "major"
+    elif 'new' in changes:
+        return "minor"
+    return "patch"
+
+
+def new_release_version(current, release_type, local=None):
+    """
+    Returns the version of a release_type release after the current Version,
+    bumping the version in the local label instead if it starts with local
+    """
+    version = DEFAULT_VERSION if local else current.base_version
+    version_in_local = False
+
+    if local and current.local and local in current.local:
+        version_in_local = re.search(VERSION_REGEX, current.local)
+        if version_in_local:
+            version = version_in_local.group()
+
+    new_version = bump_version(version, release_type)
+    if local:
+        if version_in_local:
+            new_local = re.sub(VERSION_REGEX, new_version, current.local)
+        else:
+            new_local = local + new_version
+        new_version = '+'.join([current.base_version, new_local])
+
+    return new_version
+
+
+def find_release(releases, version):
+    """
+    Gets the release of version from releases, or None if there is none.
+    Versions are compared as versions, so '1.0' finds a '1.0.0' release.
+    """
+    for release in releases:
+        if release.version == version:
+            return release
+    wanted = parse_version(version)
+    for release in releases:
+        if _parse_version_or_none(release.version) == wanted:
+            return release
+    return None
+
+
+def releases_between(releases, start, end):
+    """
+    Gets the releases after the older of versions start and end, up to and including the newer one,
+    in changelog order, i.e. the releases deployed when going from one version to the other
+    """
+    low, high = sorted([parse_version(start), parse_version(end)])
+    found = []
+    for release in releases:
+        version = _parse_version_or_none(release.version)
+        if version is not None and low < version <= high:
+            found.append(release)
+    return found
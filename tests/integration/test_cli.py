@@ -1,5 +1,7 @@
+import json
 import os
 import unittest
+from datetime import date
 
 from click.testing import CliRunner
 
@@ -96,6 +98,140 @@ class CliIntegrationTestCase(unittest.TestCase):
             result = self.runner.invoke(cli, ['breaks', 'Breaking Change'], input='y\n')
             self.assertEqual(result.output.strip(), 'No CHANGELOG.md Found, do you want to create one? [y/N]: y')
 
+    def test_cli_add_batch(self):
+        with self.runner.isolated_filesystem():
+            self.runner.invoke(cli, ['init'])
+            entries = 'fix\tFix a Bug\n{"section": "new", "message": "Adding a new feature"}\n\nbreaks\tBreaking Change\n'
+            result = self.runner.invoke(cli, ['add-batch'], input=entries)
+            self.assertEqual(result.exit_code, 0)
+            with open('CHANGELOG.md') as changelog:
+                data = changelog.read()
+            for line in ['* Fix a Bug\n', '* Adding a new feature\n', '* Breaking Change\n']:
+                self.assertIn(line, data)
+            suggest = self.runner.invoke(cli, ['suggest'])
+            self.assertEqual(suggest.output.strip(), '1.0.0')
+
+    def test_cli_add_batch_invalid(self):
+        with self.runner.isolated_filesystem():
+            self.runner.invoke(cli, ['init'])
+            invalid = ['nope\tA message\n', 'no tab\n', '{"section": "new"}\n', '{"section": "new", "message": 5}\n',
+                       '{"section": ["new"], "message": "A message"}\n', '["new", "A message"]\n']
+            for entries in invalid:
+                result = self.runner.invoke(cli, ['add-batch'], input='fix\tA Fix\n' + entries)
+                self.assertEqual(result.exit_code, 2)
+                self.assertIn('line 2', result.output)
+            suggest = self.runner.invoke(cli, ['suggest'])
+            self.assertEqual(suggest.output.strip(), '0.0.1')
+
+    def test_cli_scan(self):
+        with self.runner.isolated_filesystem():
+            os.mkdir('repository')
+            os.chdir('repository')
+            self.runner.invoke(cli, ['init'])
+            self.runner.invoke(cli, ['fix', 'Fix a Bug'])
+            os.chdir('..')
+            result = self.runner.invoke(cli, ['scan', '--workers', '1'])
+            self.assertEqual(json.loads(result.output), {
+                'path': os.path.join('.', 'repository', 'CHANGELOG.md'),
+                'current': '0.0.0',
+                'suggest': '0.0.1',
+                'unreleased': {'fix': 1},
+            })
+
+    def test_cli_profile(self):
+        with self.runner.isolated_filesystem():
+            self.runner.invoke(cli, ['init'])
+            result = self.runner.invoke(cli, ['--profile-format', 'json', '--profile-stats', 'cl.prof', 'current'])
+            output = result.output.splitlines()
+            self.assertEqual(output[0], '0.0.0')
+            report = json.loads(output[-1])
+            self.assertIn('parse', report['phases'])
+            self.assertGreater(report['counters']['lines read'], 0)
+            self.assertTrue(os.path.isfile('cl.prof'))
+
+    def test_cli_formats(self):
+        with self.runner.isolated_filesystem():
+            self.runner.invoke(cli, ['init'])
+            for action, message in [('new', 'First Feature'), ('fix', 'First Fix')]:
+                self.runner.invoke(cli, [action, message])
+                self.runner.invoke(cli, ['release', '--yes'])
+            self.runner.invoke(cli, ['new', 'Unreleased Feature'])
+            result = self.runner.invoke(cli, ['current', '--format', 'json'])
+            self.assertEqual(json.loads(result.output), {
+                'version': '0.1.1', 'local': None, 'date': date.today().isoformat(),
+                'sections': {'fix': ['First Fix']},
+            })
+            result = self.runner.invoke(cli, ['suggest', '--format', 'json'])
+            self.assertEqual(json.loads(result.output)['version'], '0.2.0')
+            self.assertEqual(json.loads(result.output)['release_type'], 'minor')
+            self.assertEqual(json.loads(result.output)['unreleased'], {'new': 1})
+            result = self.runner.invoke(cli, ['view', '--format', 'json'])
+            unreleased, current = json.loads(result.output)
+            self.assertEqual(unreleased['sections'], {'new': ['Unreleased Feature']})
+            self.assertEqual(current['version'], '0.1.1')
+            result = self.runner.invoke(cli, ['releases'])
+            self.assertEqual([json.loads(line)['version'] for line in result.output.splitlines()], ['0.1.1', '0.1.0'])
+            result = self.runner.invoke(cli, ['releases', '--format', 'json', '-n', '1'])
+            self.assertEqual([release['version'] for release in json.loads(result.output)], ['0.1.1'])
+
+    def test_cli_show_between(self):
+        with self.runner.isolated_filesystem():
+            self.runner.invoke(cli, ['init'])
+            for message in ['First Fix', 'Second Fix', 'Third Fix']:
+                self.runner.invoke(cli, ['fix', message])
+                self.runner.invoke(cli, ['release', '--yes'])
+            result = self.runner.invoke(cli, ['show', '0.0.2'])
+            self.assertEqual(result.output.splitlines()[0], '## 0.0.2 - ({})'.format(date.today().isoformat()))
+            self.assertIn('* Second Fix', result.output)
+            self.assertNotIn('* First Fix', result.output)
+            result = self.runner.invoke(cli, ['show', '0.0.9'])
+            self.assertEqual(result.exit_code, 1)
+            result = self.runner.invoke(cli, ['between', '0.0.1', '0.0.3', '--format', 'jsonl'])
+            self.assertEqual([json.loads(line)['version'] for line in result.output.splitlines()], ['0.0.3', '0.0.2'])
+
+    def test_cli_archive(self):
+        with self.runner.isolated_filesystem():
+            self.runner.invoke(cli, ['init'])
+            for message in ['First Fix', 'Second Fix', 'Third Fix']:
+                self.runner.invoke(cli, ['fix', message])
+                self.runner.invoke(cli, ['release', '--yes'])
+            self.assertEqual(self.runner.invoke(cli, ['archive']).exit_code, 2)
+            result = self.runner.invoke(cli, ['archive', '--keep', '1'])
+            archive = 'CHANGELOG-{}.md'.format(date.today().year)
+            self.assertEqual(result.output.strip(), 'Archived releases to {}'.format(archive))
+            with open('CHANGELOG.md') as changelog:
+                data = changelog.read()
+            self.assertNotIn('## 0.0.2', data)
+            self.assertIn('[{0}]({0})'.format(archive), data)
+            self.assertEqual(self.runner.invoke(cli, ['current']).output.strip(), '0.0.3')
+            self.assertIn('* First Fix', self.runner.invoke(cli, ['show', '0.0.1']).output)
+            result = self.runner.invoke(cli, ['releases'])
+            self.assertEqual([json.loads(line)['version'] for line in result.output.splitlines()],
+                             ['0.0.3', '0.0.2', '0.0.1'])
+            result = self.runner.invoke(cli, ['archive', '--before', '0.0.1'])
+            self.assertEqual(result.output.strip(), 'No releases to archive')
+
+    def test_cli_merge_driver(self):
+        with self.runner.isolated_filesystem():
+            self.runner.invoke(cli, ['init'])
+            with open('CHANGELOG.md') as changelog:
+                base = changelog.read()
+            for name, heading, message in [('ours', '### New', 'Our Feature'), ('theirs', '### Fixes', 'Their Fix')]:
+                with open(name, 'w') as changelog:
+                    changelog.write(base.replace(heading + '\n', '{}\n* {}\n'.format(heading, message)))
+            result = self.runner.invoke(cli, ['merge-driver', 'CHANGELOG.md', 'ours', 'theirs'])
+            self.assertEqual(result.exit_code, 0)
+            with open('ours') as changelog:
+                data = changelog.read()
+            self.assertIn('### New\n* Our Feature\n', data)
+            self.assertIn('### Fixes\n* Their Fix\n', data)
+            with open('theirs', 'w') as changelog:
+                changelog.write(base.replace('# CHANGELOG', '# Changes'))
+            with open('ours', 'w') as changelog:
+                changelog.write(base.replace('# CHANGELOG', '# Notes'))
+            result = self.runner.invoke(cli, ['merge-driver', 'CHANGELOG.md', 'ours', 'theirs'])
+            self.assertEqual(result.exit_code, 1)
+
     def test_cli_release(self):
         with self.runner.isolated_filesystem():
             self.runner.invoke(cli, ['init'])
@@ -0,0 +1,50 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from changelog.utils import ChangelogUtils
+
+WRITERS = 8
+ENTRIES = 10
+
+WRITER = """
+import sys
+from changelog.utils import ChangelogUtils
+CL = ChangelogUtils()
+CL.ATOMIC_WRITES = sys.argv[2] == 'atomic'
+for i in range({entries}):
+    CL.update_section(('new', 'fix', 'change', 'break')[i % 4], 'writer {{}} entry {{}}'.format(sys.argv[1], i))
+""".format(entries=ENTRIES)
+
+
+class ConcurrentWritersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.CL = ChangelogUtils(os.path.join(self.directory, 'CHANGELOG.md'))
+        self.CL.initialize_changelog_file()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_writers(self, mode):
+        processes = [
+            subprocess.Popen([sys.executable, '-c', WRITER, str(writer), mode], cwd=self.directory)
+            for writer in range(WRITERS)
+        ]
+        for process in processes:
+            self.assertEqual(process.wait(), 0)
+        data = self.CL.get_changelog_data()
+        for writer in range(WRITERS):
+            for i in range(ENTRIES):
+                self.assertIn('* writer {} entry {}\n'.format(writer, i), data)
+        self.assertEqual(len(data), len(self.CL.get_changelog_data()))
+        self.assertEqual(sorted(os.listdir(self.directory)), ['CHANGELOG.md'])
+
+    def test_atomic_writers(self):
+        self.run_writers('atomic')
+
+    def test_in_place_writers(self):
+        self.run_writers('in-place')
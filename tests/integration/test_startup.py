@@ -0,0 +1,58 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from changelog.templates import INIT
+
+# Import time, in microseconds, allowed for the changelog modules `cl new` loads, dependencies included
+IMPORT_BUDGET = 50000
+HEAVY_MODULES = ['click', 'packaging', 'json', 'datetime']
+
+
+def import_times(args, cwd):
+    """Runs changelog with -X importtime, returning {module: (self, cumulative, depth)} in microseconds"""
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-m', 'changelog'] + args,
+        cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+    )
+    _, stderr = process.communicate()
+    assert process.returncode == 0, stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_time), int(cumulative), len(name) - len(name.lstrip()) - 1)
+    return times
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "-X importtime requires python 3.7")
+class StartupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'CHANGELOG.md'), 'w') as changelog:
+            changelog.write(INIT)
+        # Warm the bytecode cache so compilation is not measured
+        import_times(['new', 'warm up'], self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_new_skips_heavy_imports(self):
+        times = import_times(['new', 'Adding a new feature'], self.directory)
+        self.assertIn('changelog.utils', times)
+        for module in times:
+            self.assertNotIn(module.split('.')[0], HEAVY_MODULES)
+        with open(os.path.join(self.directory, 'CHANGELOG.md')) as changelog:
+            self.assertIn('* Adding a new feature\n', changelog.read())
+
+    def test_new_import_budget(self):
+        times = import_times(['fix', 'Fix a Bug'], self.directory)
+        changelog_time = sum(
+            cumulative for name, (_, cumulative, depth) in times.items()
+            if depth == 0 and name.split('.')[0] == 'changelog'
+        )
+        self.assertLess(changelog_time, IMPORT_BUDGET)
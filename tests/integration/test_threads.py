@@ -0,0 +1,105 @@
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+
+from changelog.utils import ChangelogUtils
+
+THREADS = 16
+ENTRIES = 10
+SECTIONS = ('new', 'fix', 'change', 'break')
+
+
+class ThreadedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'CHANGELOG.md')
+        ChangelogUtils(self.path).initialize_changelog_file()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_threads(self, work, count=THREADS):
+        """Runs work(thread) in count threads at once, returning the results, or raising the first error"""
+        results = [None] * count
+        errors = []
+
+        def run(thread):
+            try:
+                results[thread] = work(thread)
+            except BaseException as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=run, args=(thread,)) for thread in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def assert_all_entries(self, data):
+        for thread in range(THREADS):
+            for i in range(ENTRIES):
+                self.assertEqual(data.count('* thread {} entry {}\n'.format(thread, i)), 1)
+
+    def write_entries(self, mode, shared):
+        CL = ChangelogUtils(self.path)
+
+        def work(thread):
+            utils = CL if shared else ChangelogUtils(self.path)
+            utils.ATOMIC_WRITES = mode == 'atomic'
+            for i in range(ENTRIES):
+                utils.update_section(SECTIONS[i % 4], 'thread {} entry {}'.format(thread, i))
+
+        self.run_threads(work)
+        self.assert_all_entries(''.join(CL.get_changelog_data()))
+        self.assertEqual(sorted(os.listdir(self.directory)), ['CHANGELOG.md'])
+
+    def test_atomic_writers(self):
+        self.write_entries('atomic', shared=False)
+
+    def test_in_place_writers(self):
+        self.write_entries('in-place', shared=False)
+
+    def test_shared_instance(self):
+        self.write_entries('atomic', shared=True)
+
+    def test_mixed_operations(self):
+        CL = ChangelogUtils(self.path)
+
+        def work(thread):
+            releases = 0
+            for i in range(ENTRIES):
+                CL.update_section(SECTIONS[i % 4], 'thread {} entry {}'.format(thread, i))
+                self.assertIsInstance(CL.get_changes(), dict)
+                self.assertTrue(re.match(r'^\d+\.\d+\.\d+$', CL.get_new_release_version('suggest')))
+                if i % 5 == 4:
+                    CL.cut_release('patch')
+                    releases += 1
+            return releases
+
+        releases = sum(self.run_threads(work))
+        data = ''.join(CL.get_changelog_data())
+        self.assert_all_entries(data)
+        versions = re.findall(r'^## (\S+) ', data, re.M)
+        self.assertEqual(versions, ['0.0.{}'.format(n) for n in range(releases, 0, -1)])
+
+    def test_separate_files(self):
+        def work(thread):
+            CL = ChangelogUtils(os.path.join(self.directory, str(thread), 'CHANGELOG.md'))
+            os.mkdir(os.path.dirname(CL.CHANGELOG))
+            CL.initialize_changelog_file()
+            for i in range(ENTRIES):
+                CL.update_section('fix', 'thread {} entry {}'.format(thread, i))
+            self.assertEqual(CL.get_new_release_version('suggest'), '0.0.1')
+            CL.cut_release('suggest')
+            CL.update_section('new', 'thread {} feature'.format(thread))
+            return CL.get_new_release_version('suggest'), CL.get_changes()
+
+        for thread, (version, changes) in enumerate(self.run_threads(work)):
+            self.assertEqual(version, '0.1.0')
+            self.assertEqual(changes, {'new': 'thread {} feature'.format(thread)})
@@ -0,0 +1,137 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+from packaging.version import Version
+
+from changelog import Changelog
+from changelog.templates import INIT
+from changelog.utils import ChangelogUtils
+
+SAMPLE = """# CHANGELOG
+
+## Unreleased
+---
+
+### New
+* added feature x
+
+### Changes
+
+### Fixes
+* fixed bug 1
+
+### Breaks
+
+
+## 0.3.2 - (2017-06-09)
+---
+
+### Fixes
+* fixed bug 0
+
+
+## 0.3.1 - (2017-06-01)
+---
+
+### New
+* added feature w
+"""
+
+
+class ChangelogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sources(self):
+        path = os.path.join(self.directory, 'CHANGELOG.md')
+        with open(path, 'w') as changelog:
+            changelog.write(SAMPLE)
+        expected = SAMPLE.splitlines(True)
+        for changelog in [
+            Changelog.from_string(SAMPLE),
+            Changelog.from_bytes(SAMPLE.encode('utf-8')),
+            Changelog.from_file(io.StringIO(u'' + SAMPLE)),
+            Changelog.from_file(io.BytesIO(SAMPLE.encode('utf-8'))),
+            Changelog.from_path(path),
+        ]:
+            self.assertEqual(changelog.lines, expected)
+
+    def test_new(self):
+        changelog = Changelog()
+        self.assertEqual(changelog.text, INIT)
+        self.assertEqual(changelog.get_current_version(), Version('0.0.0'))
+
+    def test_queries(self):
+        changelog = Changelog.from_string(SAMPLE)
+        self.assertEqual(changelog.get_current_version(), Version('0.3.2'))
+        self.assertEqual(changelog.get_changes(), {'new': 'added feature x', 'fix': 'fixed bug 1'})
+        self.assertEqual(changelog.get_new_release_version(), '0.4.0')
+        self.assertEqual(changelog.get_unreleased().counts, {'new': 1, 'fix': 1})
+        self.assertEqual(changelog.get_new_release_version('patch', local='user.'), '0.3.2+user.0.0.1')
+        self.assertEqual(changelog.get_current_lines(), SAMPLE.splitlines(True)[:23])
+        self.assertEqual([r['version'] for r in changelog.iter_release_records()], ['0.3.2', '0.3.1'])
+        release = changelog.find_release('0.3.1')
+        self.assertEqual(changelog.get_release_record(release)['sections'], {'new': ['added feature w']})
+        self.assertEqual([r.version for r in changelog.get_releases_between('0.3.0', '0.3.2')], ['0.3.2', '0.3.1'])
+
+    def test_matches_file_backed(self):
+        path = os.path.join(self.directory, 'CHANGELOG.md')
+        with open(path, 'w') as changelog:
+            changelog.write(SAMPLE)
+        CL = ChangelogUtils(path)
+        CL.update_section('new', 'added feature y')
+        CL.update_sections([('fix', 'fixed bug 2'), ('break', 'removed z')])
+        CL.cut_release('suggest')
+        with open(path, 'rb') as changelog:
+            expected = changelog.read()
+
+        with patch.object(builtins, 'open', side_effect=AssertionError), \
+                patch('changelog.files.replace_file', side_effect=AssertionError):
+            changelog = Changelog.from_bytes(SAMPLE.encode('utf-8'))
+            changelog.add('new', 'added feature y')
+            changelog.add_entries([('fix', 'fixed bug 2'), ('break', 'removed z')])
+            self.assertEqual(changelog.release(), '1.0.0')
+        self.assertEqual(changelog.to_bytes(), expected)
+
+    def test_crlf(self):
+        changelog = Changelog.from_string(SAMPLE.replace('\n', '\r\n'))
+        self.assertEqual(changelog.get_changes(), {'new': 'added feature x', 'fix': 'fixed bug 1'})
+        changelog.add('fix', 'fixed bug 2')
+        changelog.release('patch', date=date(2020, 1, 2))
+        self.assertEqual(changelog.get_current_version(), Version('0.3.3'))
+        self.assertIn('## 0.3.3 - (2020-01-02)\r\n', changelog.lines)
+        self.assertIn('* fixed bug 2\r\n', changelog.lines)
+        self.assertEqual([line for line in changelog.lines if not line.endswith('\r\n')], [])
+
+    def test_release_date(self):
+        changelog = Changelog.from_string(SAMPLE)
+        changelog.release('patch', date=date(2020, 1, 2))
+        self.assertIn('## 0.3.3 - (2020-01-02)\n', changelog.lines)
+        self.assertEqual(changelog.get_current_version(), Version('0.3.3'))
+
+    def test_save(self):
+        path = os.path.join(self.directory, 'CHANGELOG.md')
+        changelog = Changelog.from_string(SAMPLE)
+        changelog.add('change', 'changed v')
+        changelog.save(path)
+        self.assertEqual(Changelog.from_path(path).lines, changelog.lines)
+        output = io.StringIO()
+        changelog.write(output)
+        self.assertEqual(output.getvalue(), str(changelog))
@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from packaging.version import Version
+
+from changelog.cache import IndexCache
+from changelog.utils import ChangelogUtils
+
+SAMPLE = """# CHANGELOG
+
+## Unreleased
+---
+
+### New
+* added feature x
+
+### Fixes
+* fixed bug 1
+
+
+## 0.3.2 - (2017-06-09)
+---
+
+### Fixes
+* fixed bug 0
+"""
+
+
+class IndexCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'CHANGELOG.md')
+        with open(self.path, 'w') as changelog:
+            changelog.write(SAMPLE)
+        self.cache = IndexCache(os.path.join(self.directory, 'cache'))
+        self.CL = ChangelogUtils()
+        self.CL.CHANGELOG = self.path
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def store(self):
+        document = self.CL.get_document()
+        stat = os.stat(self.path)
+        document.read(1)
+        self.cache.store(self.path, stat, document)
+
+    def test_load_missing(self):
+        self.assertIsNone(self.cache.load(self.path))
+
+    def test_load(self):
+        self.store()
+        index = self.cache.load(self.path)
+        self.assertEqual(index.current_release.version, '0.3.2')
+        self.assertEqual(index.get_changes(), {'new': 'added feature x', 'fix': 'fixed bug 1'})
+        self.assertEqual(index.unreleased.headings, self.CL.get_document().unreleased.headings)
+
+    def test_load_modified(self):
+        self.store()
+        with open(self.path, 'a') as changelog:
+            changelog.write("* fixed bug -1\n")
+        self.assertIsNone(self.cache.load(self.path))
+
+    def test_load_same_stat_different_content(self):
+        self.store()
+        stat = os.stat(self.path)
+        with open(self.path, 'w') as changelog:
+            changelog.write(SAMPLE.replace('0.3.2', '0.3.3'))
+        if hasattr(stat, 'st_mtime_ns'):
+            os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        else:
+            os.utime(self.path, (stat.st_atime, stat.st_mtime))
+        self.assertIsNone(self.cache.load(self.path))
+
+    def test_sidecar(self):
+        cache = IndexCache()
+        self.assertEqual(cache.cache_path(self.path), os.path.join(self.directory, '.changelog-cache'))
+
+    def test_from_environment(self):
+        with patch.dict(os.environ, {'CHANGELOG_CACHE': ''}):
+            self.assertIsNone(IndexCache.from_environment())
+        with patch.dict(os.environ, {'CHANGELOG_CACHE': 'xdg', 'XDG_CACHE_HOME': self.directory}):
+            self.assertEqual(IndexCache.from_environment().directory, os.path.join(self.directory, 'changelog-cli'))
+
+    def test_complete_index(self):
+        document = self.CL.get_document()
+        stat = os.stat(self.path)
+        document.read()
+        self.cache.store(self.path, stat, document)
+        index = self.cache.load(self.path)
+        self.assertTrue(index.complete)
+        self.assertEqual([r.end_offset for r in index.releases], [len(SAMPLE)])
+
+    def test_archives(self):
+        with open(self.path, 'a') as changelog:
+            changelog.write("\nOlder releases are archived in [CHANGELOG-2017.md](CHANGELOG-2017.md).\n")
+        document = self.CL.get_document()
+        stat = os.stat(self.path)
+        document.read()
+        self.cache.store(self.path, stat, document)
+        self.assertEqual(self.cache.load(self.path).archives, ['CHANGELOG-2017.md'])
+
+    def test_utils_release_index_from_cache(self):
+        with patch.dict(os.environ, {'CHANGELOG_CACHE': self.cache.directory}):
+            self.CL.get_release_index()
+            with patch.object(ChangelogUtils, 'iter_changelog_lines', side_effect=AssertionError):
+                CL = ChangelogUtils(self.path)
+                release = CL.find_release('0.3.2')
+                self.assertEqual(CL.get_release_lines(release), SAMPLE.splitlines(True)[12:])
+
+    def test_utils_answers_from_cache(self):
+        with patch.dict(os.environ, {'CHANGELOG_CACHE': self.cache.directory}):
+            self.assertEqual(self.CL.get_current_version(), Version('0.3.2'))
+            with patch.object(ChangelogUtils, 'iter_changelog_lines', side_effect=AssertionError):
+                CL = ChangelogUtils()
+                CL.CHANGELOG = self.path
+                self.assertEqual(CL.get_current_version(), Version('0.3.2'))
+                self.assertEqual(CL.get_release_suggestion(), 'minor')
+
+    def test_utils_loads_index_once(self):
+        with patch.dict(os.environ, {'CHANGELOG_CACHE': self.cache.directory}):
+            self.CL.get_current_version()
+            CL = ChangelogUtils(self.path)
+            with patch.object(IndexCache, 'load', autospec=True, side_effect=IndexCache.load) as load:
+                self.assertEqual(CL.get_new_release_version('suggest'), '0.4.0')
+                self.assertEqual(CL.get_changes(), {'new': 'added feature x', 'fix': 'fixed bug 1'})
+                self.assertEqual(load.call_count, 1)
+                # Writing drops the loaded index
+                CL.update_section('new', 'added feature y')
+                self.assertEqual(CL.get_current_version(), Version('0.3.2'))
+                self.assertEqual(load.call_count, 2)
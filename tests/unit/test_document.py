@@ -0,0 +1,208 @@
+import unittest
+
+from changelog.document import (
+    ChangelogDocument,
+    iter_crunched_lines,
+    iter_release_lines,
+    match_archive_line,
+    match_release_line,
+    normalize,
+    parse_sections,
+)
+from changelog.templates import UNRELEASED
+
+SAMPLE_DATA = [
+    "# CHANGELOG\n",
+    "\n",
+    "## Unreleased\n",
+    "---\n",
+    "\n",
+    "### New\n",
+    "* added feature y\n",
+    "* added feature x\n",
+    "\n",
+    "### Fixes\n",
+    "* fixed bug 1\n",
+    "\n",
+    "### Breaks\n",
+    "\n",
+    "\n",
+    "## 0.3.2 - (2017-06-09)\n",
+    "---\n",
+    "\n",
+    "### Fixes\n",
+    "* fixed bug 0\n",
+    "\n",
+    "## [0.3.1] - 2017-06-01\n",
+    "---\n",
+]
+
+
+class ChangelogDocumentTestCase(unittest.TestCase):
+    def setUp(self):
+        self.document = ChangelogDocument(SAMPLE_DATA)
+        self.document.read()
+
+    def test_header(self):
+        self.assertEqual(self.document.header, ["# CHANGELOG\n", "\n"])
+
+    def test_unreleased(self):
+        unreleased = self.document.unreleased
+        self.assertEqual((unreleased.start, unreleased.end), (2, 15))
+        self.assertEqual(unreleased.sections, {
+            'new': ['added feature y', 'added feature x'],
+            'fix': ['fixed bug 1'],
+        })
+
+    def test_releases(self):
+        releases = [(r.version, r.date, r.start, r.end) for r in self.document.releases]
+        self.assertEqual(releases, [
+            ('0.3.2', '2017-06-09', 15, 21),
+            ('0.3.1', '2017-06-01', 21, 23),
+        ])
+
+    def test_byte_offsets(self):
+        data = ''.join(SAMPLE_DATA).encode('utf-8')
+        for block in [self.document.unreleased] + self.document.releases:
+            expected = ''.join(SAMPLE_DATA[block.start:block.end]).encode('utf-8')
+            self.assertEqual(data[block.offset:block.end_offset], expected)
+        self.assertEqual(self.document.size, len(data))
+
+    def test_read_stops_at_release(self):
+        document = ChangelogDocument(iter(SAMPLE_DATA))
+        self.assertEqual(document.current_release.version, '0.3.2')
+        self.assertEqual(len(document.lines), 16)
+        self.assertFalse(document.complete)
+        document.read(2)
+        self.assertEqual(len(document.lines), 22)
+        self.assertEqual(document.releases[0].end, 21)
+        document.read()
+        self.assertTrue(document.complete)
+        self.assertEqual(len(document.lines), len(SAMPLE_DATA))
+
+    def test_get_changes(self):
+        self.assertEqual(self.document.get_changes(), {'new': 'added feature x', 'fix': 'fixed bug 1'})
+
+    def test_unreleased_index(self):
+        unreleased = self.document.unreleased
+        self.assertEqual(unreleased.counts, {'new': 2, 'fix': 1})
+        merged = unreleased.with_entries([('fix', 'fixed bug 2'), ('break', 'removed z')])
+        self.assertEqual(merged.sections['fix'], ['fixed bug 2', 'fixed bug 1'])
+        self.assertEqual(merged.counts, {'new': 2, 'fix': 2, 'break': 1})
+        self.assertEqual(unreleased.counts, {'new': 2, 'fix': 1})
+
+    def test_read_unreleased_stops_at_heading(self):
+        lines = SAMPLE_DATA[:9] + ["## Notes\n", "* not an entry\n"] + SAMPLE_DATA[15:]
+        document = ChangelogDocument(iter(lines))
+        self.assertEqual(document.get_changes(), {'new': 'added feature x'})
+        self.assertEqual(len(document.lines), 10)
+        self.assertEqual(document.unreleased.end, 9)
+        self.assertEqual(document.current_release.version, '0.3.2')
+        self.assertEqual(document.unreleased.sections, {'new': ['added feature y', 'added feature x']})
+        self.assertEqual(document.unreleased.end, 9)
+
+    def test_trailing_whitespace(self):
+        lines = [line.replace('\n', ' \t\r\n') for line in SAMPLE_DATA]
+        document = ChangelogDocument(lines)
+        document.read()
+        self.assertEqual(document.unreleased.sections, self.document.unreleased.sections)
+        releases = [(r.version, r.date) for r in document.releases]
+        self.assertEqual(releases, [('0.3.2', '2017-06-09'), ('0.3.1', '2017-06-01')])
+        self.assertEqual(document.release_sections(document.releases[0]), {'fix': ['fixed bug 0']})
+        inserted = document.insert_entries([('fix', 'fixed bug 2')])
+        self.assertEqual(inserted[inserted.index('### Fixes \t\r\n') + 1], '* fixed bug 2\r\n')
+        released = list(iter_crunched_lines(document.release_lines('## 0.4.0 - (2017-06-10)\n', {'new': 'x'})))
+        self.assertIn('## 0.4.0 - (2017-06-10)\r\n', released)
+        self.assertEqual([line for line in released if not line.endswith('\r\n')], [])
+
+    def test_archive_pointer(self):
+        pointer = "Older releases are archived in [CHANGELOG-2017.md](CHANGELOG-2017.md).\n"
+        document = ChangelogDocument(SAMPLE_DATA[:21] + [pointer])
+        document.read()
+        self.assertEqual(document.archives, ['CHANGELOG-2017.md'])
+        self.assertEqual((document.releases[0].end, document.pointer), (21, 21))
+        self.assertEqual(document.release_sections(document.releases[0]), {'fix': ['fixed bug 0']})
+        document = ChangelogDocument(iter(SAMPLE_DATA[:15] + [pointer]))
+        self.assertEqual(document.get_changes(), {'new': 'added feature x', 'fix': 'fixed bug 1'})
+        self.assertEqual(document.unreleased.end, 15)
+        self.assertIsNone(document.current_release)
+
+    def test_normalize(self):
+        self.assertEqual(normalize('### New\n'), '### New\n')
+        self.assertEqual(normalize('### New \r\n'), '### New\n')
+        self.assertEqual(normalize('---'), '---\n')
+        self.assertEqual(normalize(' \r\n'), '\n')
+
+    def test_empty(self):
+        document = ChangelogDocument([])
+        self.assertIsNone(document.unreleased)
+        self.assertIsNone(document.current_release)
+        self.assertEqual(document.get_changes(), {})
+
+    def test_insert_entries(self):
+        expected = SAMPLE_DATA
+        for section, message in [('new', 'a'), ('fix', 'b'), ('new', 'c')]:
+            expected = ChangelogDocument(expected).insert_entry(section, message)
+        output = self.document.insert_entries([('new', 'a'), ('fix', 'b'), ('new', 'c')])
+        self.assertEqual(output, expected)
+
+    def test_insert_entries_missing_section(self):
+        self.assertRaises(ValueError, self.document.insert_entries, [('change', 'a')])
+
+    def test_release_lines(self):
+        output = self.document.release_lines("## 0.4.0 - (2017-07-01)\n", self.document.get_changes())
+        self.assertEqual(output[2:4], [UNRELEASED, "## 0.4.0 - (2017-07-01)\n"])
+        self.assertNotIn("### Breaks\n", output[4:15])
+
+    def test_iter_releases(self):
+        source = iter(SAMPLE_DATA)
+        document = ChangelogDocument(source)
+        release = next(document.iter_releases())
+        self.assertEqual(release.version, '0.3.2')
+        self.assertEqual(document.release_sections(release), {'fix': ['fixed bug 0']})
+        self.assertEqual(list(source), ["---\n"])
+        self.assertEqual([r.version for r in document.iter_releases()], ['0.3.2', '0.3.1'])
+
+    def test_parse_sections(self):
+        self.assertEqual(parse_sections(SAMPLE_DATA[3:15]), {
+            'new': ['added feature y', 'added feature x'],
+            'fix': ['fixed bug 1'],
+        })
+        self.assertEqual(parse_sections(["* loose\n", "### New\n"]), {None: ['loose']})
+
+    def test_release_lines_without_unreleased(self):
+        lines = SAMPLE_DATA[:2] + SAMPLE_DATA[15:]
+        output = ChangelogDocument(lines).release_lines("## 0.4.0 - (2017-07-01)\n", {})
+        self.assertEqual(output, [UNRELEASED] + lines)
+
+    def test_iter_release_lines_streams_history(self):
+        source = iter(SAMPLE_DATA)
+        output = iter_release_lines(source, "## 0.4.0 - (2017-07-01)\n", {})
+        for _ in range(5):
+            next(output)
+        self.assertEqual(next(source), "\n")
+
+
+class MatchArchiveLineTestCase(unittest.TestCase):
+    def test_links(self):
+        line = "Older releases are archived in [CHANGELOG-2018.md](CHANGELOG-2018.md), [2017](CHANGELOG-2017.md).\r\n"
+        self.assertEqual(match_archive_line(line), ['CHANGELOG-2018.md', 'CHANGELOG-2017.md'])
+
+    def test_miss(self):
+        for line in ["* Older releases are archived in [a](a)\n", "## Unreleased\n", "\n"]:
+            self.assertIsNone(match_archive_line(line))
+
+
+class MatchReleaseLineTestCase(unittest.TestCase):
+    def test_canonical(self):
+        self.assertEqual(match_release_line("## 0.2.1+user.1.0.0 - (2017-06-09)\n"), ('0.2.1+user.1.0.0', '2017-06-09'))
+
+    def test_basic(self):
+        self.assertEqual(match_release_line("## v4.1.3\n"), ('4.1.3', None))
+
+    def test_keep_a_changelog(self):
+        self.assertEqual(match_release_line("## [4.1.3] - 2017-06-20\n"), ('4.1.3', '2017-06-20'))
+
+    def test_miss(self):
+        for line in ["* 0.2.1 - (2017-06-09)\n", "### Changes\n", "## Unreleased\n", "\n"]:
+            self.assertIsNone(match_release_line(line))
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from changelog.journal import Journal
+from changelog.utils import ChangelogUtils
+
+
+class JournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'CHANGELOG.md')
+        self.CL = ChangelogUtils(self.path)
+        self.CL.initialize_changelog_file()
+        self.journal = Journal.for_changelog(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_disabled(self):
+        self.assertIsNone(self.CL.get_journal())
+        self.CL.update_section('new', 'logged')
+        self.assertIn('* logged\n', self.CL.get_changelog_data())
+
+    def test_append_read(self):
+        self.journal.create()
+        self.journal.append('fix', 'first')
+        self.journal.append('new', 'second')
+        self.assertEqual(self.journal.read(), [('fix', 'first'), ('new', 'second')])
+        self.assertRaises(KeyError, self.journal.append, 'nope', 'third')
+
+    def test_update_section_appends(self):
+        self.journal.create()
+        original = self.CL.get_changelog_data()
+        self.CL.update_section('fix', 'fixed bug 1')
+        self.CL.update_sections([('new', 'added feature x'), ('new', 'added feature y')])
+        self.assertEqual(self.CL.get_changelog_data(), original)
+        self.assertEqual(len(self.journal.names()), 3)
+
+    def test_queries_merge_journal(self):
+        self.CL.update_section('fix', 'fixed bug 0')
+        self.journal.create()
+        self.CL.update_section('fix', 'fixed bug 1')
+        self.CL.update_section('new', 'added feature x')
+        self.assertEqual(self.CL.get_changes(), {'fix': 'fixed bug 0', 'new': 'added feature x'})
+        self.assertEqual(self.CL.get_unreleased().counts, {'fix': 2, 'new': 1})
+        self.assertEqual(self.CL.get_unreleased().sections['fix'], ['fixed bug 1', 'fixed bug 0'])
+        self.assertEqual(self.CL.get_new_release_version('suggest'), '0.1.0')
+        lines = self.CL.get_current_lines()
+        self.assertLess(lines.index('* fixed bug 1\n'), lines.index('* fixed bug 0\n'))
+        self.assertIn('* added feature x\n', lines)
+
+    def test_release_compacts_journal(self):
+        self.journal.create()
+        self.CL.update_section('new', 'added feature x')
+        self.CL.update_section('new', 'added feature y')
+        os.mkdir(os.path.join(self.directory, 'expected'))
+        expected = ChangelogUtils(os.path.join(self.directory, 'expected', 'CHANGELOG.md'))
+        expected.initialize_changelog_file()
+        expected.update_section('new', 'added feature x')
+        expected.update_section('new', 'added feature y')
+        self.CL.cut_release()
+        expected.cut_release()
+        self.assertEqual(self.journal.names(), [])
+        self.assertEqual(self.CL.get_changelog_data(), expected.get_changelog_data())
+        self.assertEqual(str(self.CL.get_current_version()), '0.1.0')
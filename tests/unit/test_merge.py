@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from changelog.merge import merge, merge_files
+
+BASE = """# CHANGELOG
+
+## Unreleased
+---
+
+### New
+* added feature x
+
+### Fixes
+
+
+## 0.1.0 - (2017-06-09)
+---
+
+### Fixes
+* fixed bug 0
+"""
+
+RELEASED = """# CHANGELOG
+
+## Unreleased
+---
+
+### New
+
+### Fixes
+
+
+## 0.2.0 - (2017-07-01)
+---
+
+### New
+* added feature x
+
+## 0.1.0 - (2017-06-09)
+---
+
+### Fixes
+* fixed bug 0
+"""
+
+
+def add(data, heading, *entries):
+    return data.replace(heading + '\n', heading + '\n' + ''.join('* {}\n'.format(entry) for entry in entries), 1)
+
+
+def lines(data):
+    return data.splitlines(True)
+
+
+class MergeTestCase(unittest.TestCase):
+    def assert_merged(self, base, ours, theirs, expected):
+        merged, clean = merge(lines(base), lines(ours), lines(theirs))
+        self.assertTrue(clean)
+        self.assertEqual(''.join(merged), expected)
+
+    def test_union_of_entries(self):
+        ours = add(add(BASE, '### New', 'added feature y'), '### Fixes', 'fixed bug 1')
+        theirs = add(add(BASE, '### New', 'added feature z'), '### Fixes', 'fixed bug 2')
+        expected = add(BASE, '### New', 'added feature z', 'added feature y')
+        expected = add(expected, '### Fixes', 'fixed bug 2', 'fixed bug 1')
+        self.assert_merged(BASE, ours, theirs, expected)
+
+    def test_one_side_changed(self):
+        ours = add(BASE, '### New', 'added feature y')
+        self.assert_merged(BASE, ours, BASE, ours)
+        self.assert_merged(BASE, BASE, ours, ours)
+        self.assert_merged(BASE, ours, ours, ours)
+
+    def test_release_on_one_side(self):
+        ours = add(BASE, '### Fixes', 'fixed bug 1')
+        expected = add(RELEASED, '### Fixes', 'fixed bug 1')
+        self.assert_merged(BASE, ours, RELEASED, expected)
+        self.assert_merged(BASE, add(RELEASED, '### Fixes', 'fixed bug 2'), ours,
+                           add(RELEASED, '### Fixes', 'fixed bug 1', 'fixed bug 2'))
+
+    def test_removed_entries(self):
+        ours = add(BASE, '### New', 'added feature y')
+        theirs = BASE.replace('* added feature x\n', '')
+        self.assert_merged(BASE, ours, add(theirs, '### Fixes', 'fixed bug 1'),
+                           add(add(theirs, '### New', 'added feature y'), '### Fixes', 'fixed bug 1'))
+
+    def test_line_endings(self):
+        base = BASE.replace('\n', '\r\n')
+        ours = add(BASE, '### New', 'added feature y').replace('\n', '\r\n')
+        theirs = add(BASE, '### Fixes', 'fixed bug 1')
+        merged, clean = merge(lines(base), lines(ours), lines(theirs.replace('\n', '\r\n')))
+        self.assertTrue(clean)
+        self.assertEqual(''.join(merged), add(add(BASE, '### New', 'added feature y'), '### Fixes', 'fixed bug 1')
+                         .replace('\n', '\r\n'))
+
+    def test_history_conflict(self):
+        ours = BASE.replace('fixed bug 0', 'fixed bug zero')
+        theirs = BASE.replace('fixed bug 0', 'fixed bug nought')
+        merged, clean = merge(lines(BASE), lines(add(ours, '### New', 'y')), lines(add(theirs, '### New', 'z')))
+        self.assertFalse(clean)
+        merged = ''.join(merged)
+        self.assertIn('<<<<<<< ours\n## 0.1.0 - (2017-06-09)\n', merged)
+        self.assertIn('* fixed bug nought\n>>>>>>> theirs\n', merged)
+        self.assertIn('### New\n* z\n* y\n', merged)
+
+    def test_missing_section(self):
+        ours = add(BASE, '### New', 'added feature y').replace('### Fixes\n', '')
+        theirs = add(BASE, '### Fixes', 'fixed bug 1')
+        merged, clean = merge(lines(BASE), lines(ours), lines(theirs))
+        self.assertFalse(clean)
+        self.assertEqual(''.join(merged).count('=======\n'), 1)
+
+    def test_custom_section(self):
+        base = BASE.replace('### Fixes\n', '### Fixes\n\n### Security\n')
+        ours = add(base, '### New', 'a')
+        theirs = add(base, '### Security', 'sec')
+        self.assert_merged(base, ours, theirs, add(ours, '### Security', 'sec'))
+        merged, clean = merge(lines(BASE), lines(add(BASE, '### New', 'a')), lines(theirs))
+        self.assertFalse(clean)
+        self.assertNotIn('### Fixes\n* sec\n', ''.join(merged))
+
+    def test_merge_files(self):
+        directory = tempfile.mkdtemp()
+        try:
+            paths = [os.path.join(directory, name) for name in ('base', 'ours', 'theirs')]
+            for path, data in zip(paths, [BASE, add(BASE, '### New', 'y'), add(BASE, '### Fixes', 'z')]):
+                with open(path, 'w') as changelog:
+                    changelog.write(data)
+            self.assertTrue(merge_files(*paths))
+            with open(paths[1]) as changelog:
+                self.assertEqual(changelog.read(), add(add(BASE, '### New', 'y'), '### Fixes', 'z'))
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,113 @@
+import mmap
+import os
+import shutil
+import tempfile
+import unittest
+
+from changelog import Changelog
+from changelog.model import CompactChangelog, Entry
+from changelog.versions import parse_version
+
+SAMPLE = """# CHANGELOG
+
+## Unreleased
+---
+
+### New
+* added feature y
+* added feature x
+
+### Fixes
+* fixed bug 1
+
+### Breaks
+
+
+## 0.3.2 - (2017-06-09)
+---
+
+### Fixes
+* fixed bug 0
+*   spaced  \t
+
+## [0.3.1] - 2017-06-01
+---
+
+### New
+* added feature w
+"""
+
+
+class CompactChangelogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.changelog = CompactChangelog(SAMPLE.encode('utf-8'))
+
+    def test_matches_document(self):
+        expected = Changelog.from_string(SAMPLE)
+        for data in (SAMPLE, SAMPLE.replace('\n', '\r\n')):
+            changelog = CompactChangelog(data.encode('utf-8'))
+            self.assertEqual(changelog.unreleased.record(), expected.get_unreleased_record())
+            self.assertEqual([r.record() for r in changelog.releases], list(expected.iter_release_records()))
+        self.assertEqual(self.changelog.unreleased.counts, expected.get_unreleased().counts)
+
+    def test_releases(self):
+        release = self.changelog.current_release
+        self.assertEqual((release.version, release.date), ('0.3.2', '2017-06-09'))
+        self.assertIs(release.parsed_version, parse_version('0.3.2'))
+        self.assertEqual(release.text, SAMPLE[SAMPLE.index('## 0.3.2'):SAMPLE.index('## [0.3.1]')])
+        self.assertEqual(release.section('fix').texts, ['fixed bug 0', 'spaced'])
+        self.assertIsNone(release.section('new'))
+        self.assertEqual(self.changelog.find_release('0.3.1').version, '0.3.1')
+        self.assertEqual([r.version for r in self.changelog.get_releases_between('0.3.0', '0.3.2')], ['0.3.2', '0.3.1'])
+
+    def test_entries_share_buffer(self):
+        section = self.changelog.unreleased.section('new')
+        self.assertEqual(len(section), 2)
+        entry = section[1]
+        self.assertIs(entry.buffer, self.changelog.buffer)
+        self.assertEqual(str(entry), 'added feature x')
+        self.assertEqual(repr(entry), "Entry({!r})".format(u'added feature x'))
+
+    def test_immutable(self):
+        release = self.changelog.current_release
+        with self.assertRaises(AttributeError):
+            release.version = '1.0.0'
+        with self.assertRaises(AttributeError):
+            del self.changelog.buffer
+        with self.assertRaises(AttributeError):
+            Entry(b'', 0, 0).text = 'x'
+
+    def test_unreleased_ends_at_heading(self):
+        changelog = CompactChangelog(SAMPLE.replace('### Breaks\n', '## Notes\n* not an entry\n').encode('utf-8'))
+        self.assertEqual(changelog.unreleased.counts, {'new': 2, 'fix': 1})
+        self.assertEqual([r.version for r in changelog.releases], ['0.3.2', '0.3.1'])
+
+    def test_buffers(self):
+        data = SAMPLE.replace('\n', ' \r\n').encode('utf-8')
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'CHANGELOG.md')
+            with open(path, 'wb') as changelog:
+                changelog.write(data)
+            with open(path, 'rb') as changelog:
+                mapped = mmap.mmap(changelog.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for buffer in (data, bytearray(data), memoryview(data), mapped):
+                    changelog = CompactChangelog(buffer)
+                    self.assertIs(changelog.buffer, buffer)
+                    self.assertEqual(changelog.unreleased.section('new').texts, ['added feature y', 'added feature x'])
+                    self.assertEqual(changelog.releases[1].record()['sections'], {'new': ['added feature w']})
+                    self.assertEqual(changelog.releases[1].date, '2017-06-01')
+                    del changelog
+            finally:
+                mapped.close()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_without_unreleased(self):
+        changelog = CompactChangelog(SAMPLE[SAMPLE.index('## 0.3.2'):].encode('utf-8'))
+        self.assertIsNone(changelog.unreleased)
+        self.assertEqual(len(changelog.releases), 2)
+        empty = CompactChangelog(b'')
+        self.assertIsNone(empty.unreleased)
+        self.assertIsNone(empty.current_release)
@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from changelog.scan import find_changelogs, scan, summarize
+from changelog.utils import ChangelogUtils
+
+
+class ScanTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for repository in ['one', os.path.join('nested', 'two'), os.path.join('.git', 'three'), 'empty']:
+            os.makedirs(os.path.join(self.directory, repository))
+        for repository, section in [('one', 'new'), (os.path.join('nested', 'two'), 'break'),
+                                    (os.path.join('.git', 'three'), 'fix')]:
+            CL = ChangelogUtils(os.path.join(self.directory, repository, 'CHANGELOG.md'))
+            CL.initialize_changelog_file()
+            CL.update_section(section, 'a message')
+        self.expected = [
+            {'path': os.path.join(self.directory, 'nested', 'two', 'CHANGELOG.md'),
+             'current': '0.0.0', 'suggest': '1.0.0', 'unreleased': {'break': 1}},
+            {'path': os.path.join(self.directory, 'one', 'CHANGELOG.md'),
+             'current': '0.0.0', 'suggest': '0.1.0', 'unreleased': {'new': 1}},
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_find_changelogs(self):
+        self.assertEqual(list(find_changelogs([self.directory])), [
+            os.path.join(self.directory, 'nested', 'two', 'CHANGELOG.md'),
+            os.path.join(self.directory, 'one', 'CHANGELOG.md'),
+        ])
+
+    def test_summarize_missing(self):
+        summary = summarize(os.path.join(self.directory, 'empty', 'CHANGELOG.md'))
+        self.assertEqual(summary['error'], 'ChangelogDoesNotExistError: ')
+
+    def test_scan_in_process(self):
+        self.assertEqual(list(scan([self.directory], workers=1)), self.expected)
+
+    def test_scan_pool(self):
+        results = sorted(scan([self.directory], workers=2), key=lambda summary: summary['path'])
+        self.assertEqual(results, self.expected)
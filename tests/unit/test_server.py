@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from changelog.client import TOKEN_ENV, build_request, forward, parse_address, token_path
+from changelog.server import ChangelogCache, handle_request, make_server
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+from changelog.utils import ChangelogUtils
+
+
+def open_paths():
+    """Gets the paths of the files this process has open"""
+    paths = []
+    for fd in os.listdir('/proc/self/fd'):
+        try:
+            paths.append(os.readlink(os.path.join('/proc/self/fd', fd)))
+        except OSError:
+            pass
+    return paths
+
+
+class ClientTestCase(unittest.TestCase):
+    def test_parse_address(self):
+        self.assertEqual(parse_address('8765')[1], ('127.0.0.1', 8765))
+        self.assertEqual(parse_address('localhost:8765')[1], ('localhost', 8765))
+
+    def test_build_request(self):
+        path = '/repository/CHANGELOG.md'
+        self.assertEqual(build_request(['fix', 'Fix a Bug'], path),
+                         {'command': 'fix', 'path': path, 'message': 'Fix a Bug'})
+        self.assertEqual(build_request(['suggest', '-l', 'user.'], path),
+                         {'command': 'suggest', 'path': path, 'local': 'user.'})
+        self.assertEqual(build_request(['release', '--yes', '--local=user.'], path),
+                         {'command': 'release', 'path': path, 'local': 'user.', 'release_type': 'suggest'})
+
+    def test_build_request_local_only(self):
+        for args in [[], ['init'], ['release'], ['release', '--major', '--yes'], ['new', '--help'], ['view', '-x']]:
+            self.assertIsNone(build_request(args, '/repository/CHANGELOG.md'))
+
+
+class ServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'CHANGELOG.md')
+        ChangelogUtils(self.path).initialize_changelog_file()
+        self.cache = ChangelogCache(size=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def request(self, command, token=None, roots=None, **kwargs):
+        kwargs.update(command=command, path=self.path)
+        return handle_request(kwargs, self.cache, token, roots)
+
+    def test_cache_reuses_unchanged(self):
+        CL = self.cache.get(self.path)
+        self.assertIs(self.cache.get(self.path), CL)
+        with open(self.path, 'a') as changelog:
+            changelog.write('\n')
+        self.assertIsNot(self.cache.get(self.path), CL)
+
+    def test_cache_evicts_least_recently_used(self):
+        first = self.cache.get(self.path)
+        self.cache.get(os.path.join(self.directory, 'one.md'))
+        self.cache.get(self.path)
+        self.cache.get(os.path.join(self.directory, 'two.md'))
+        self.assertEqual(len(self.cache), 2)
+        self.assertIs(self.cache.get(self.path), first)
+
+    def test_commands(self):
+        self.assertEqual(self.request('new', message='Adding a new feature'), {'ok': True, 'output': None})
+        self.assertEqual(self.request('suggest')['output'], '0.1.0')
+        self.assertIn('* Adding a new feature', self.request('view')['output'])
+        self.assertTrue(self.request('release')['ok'])
+        self.assertEqual(self.request('current')['output'], '0.1.0')
+
+    @unittest.skipUnless(os.path.isdir('/proc/self/fd'), "lists open files through /proc")
+    def test_cached_changelogs_closed(self):
+        # Windows cannot replace a file the server still has open
+        for command in ('new', 'release', 'fix'):
+            self.request(command, message='Adding a new feature')
+        for command in ('current', 'suggest', 'view', 'nope'):
+            self.request(command)
+            self.assertNotIn(os.path.realpath(self.path), open_paths())
+        self.assertEqual(self.request('current')['output'], '0.1.0')
+
+    def test_errors(self):
+        self.assertEqual(self.request('nope'), {'ok': False, 'error': 'Unknown command: nope'})
+        os.remove(self.path)
+        self.assertEqual(self.request('current'), {'ok': False, 'error': 'missing'})
+
+    def test_release_needs_unreleased(self):
+        with open(self.path, 'w') as changelog:
+            changelog.write('# Not a changelog\n')
+        self.assertFalse(self.request('release')['ok'])
+        with open(self.path) as changelog:
+            self.assertEqual(changelog.read(), '# Not a changelog\n')
+
+    def test_token_and_roots(self):
+        self.assertEqual(self.request('current', token='secret'), {'ok': False, 'error': 'Invalid token'})
+        self.assertTrue(self.request('current', token=None, roots=[os.path.realpath(self.directory)])['ok'])
+        self.assertFalse(self.request('current', roots=[os.path.realpath(os.getcwd())])['ok'])
+        request = {'command': 'current', 'path': self.path, 'token': 'secret'}
+        self.assertTrue(handle_request(request, self.cache, 'secret')['ok'])
+
+    def serve(self, address, **kwargs):
+        server = make_server(address, **kwargs)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        return server, '{}:{}'.format(*server.server_address), stop
+
+    def test_forward(self):
+        with patch.dict(os.environ, {TOKEN_ENV: 'secret'}):
+            server, address, stop = self.serve('127.0.0.1:0', roots=[self.directory])
+            try:
+                self.assertEqual(forward(['breaks', 'Breaking Change'], address, self.path), 0)
+                self.assertIsNone(forward(['init'], address, self.path))
+                self.assertEqual(ChangelogUtils(self.path).get_release_suggestion(), 'major')
+                with patch.dict(os.environ, {TOKEN_ENV: 'wrong'}):
+                    self.assertEqual(forward(['fix', 'Fix a Bug'], address, self.path), 1)
+            finally:
+                stop()
+            self.assertIsNone(forward(['current'], address, self.path))
+
+    def test_forward_generated_token(self):
+        environ = dict((key, value) for key, value in os.environ.items() if key != TOKEN_ENV)
+        environ['HOME'] = self.directory
+        with patch.dict(os.environ, environ, clear=True):
+            server, address, stop = self.serve('127.0.0.1:0')
+            try:
+                path = token_path(server.server_address[1])
+                self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+                self.assertEqual(forward(['fix', 'Fix a Bug'], address, self.path), 1)
+            finally:
+                stop()
+            self.assertFalse(os.path.exists(path))
+            with patch('os.getcwd', return_value=self.directory):
+                server, address, stop = self.serve('127.0.0.1:0')
+            try:
+                self.assertEqual(forward(['fix', 'Fix a Bug'], address, self.path), 0)
+            finally:
+                stop()
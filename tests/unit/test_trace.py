@@ -0,0 +1,97 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from changelog import trace
+from changelog.templates import INIT
+from changelog.utils import ChangelogUtils
+from changelog.versions import _VERSIONS
+
+
+class TraceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tracer = trace.start('json')
+
+    def tearDown(self):
+        trace.stop()
+
+    def test_inactive(self):
+        trace.stop()
+        lines = ['a\n']
+        self.assertIs(trace.iterate('read', lines), lines)
+        with trace.phase('parse'):
+            trace.count('lines read', 1)
+        self.assertFalse(trace.active())
+
+    def test_nested_phases_are_exclusive(self):
+        with trace.phase('write'):
+            with trace.phase('crunch'):
+                time.sleep(0.05)
+        phases = dict(self.tracer.summary()[0])
+        self.assertEqual(sorted(phases), ['crunch', 'other', 'write'])
+        self.assertGreaterEqual(phases['crunch'], 0.05)
+        self.assertLess(phases['write'], 0.05)
+
+    def test_reading_counts(self):
+        lines = [u'a\n', u'b\xe9\n'] * 1500
+        self.assertEqual(list(trace.reading(lines)), lines)
+        self.assertEqual(self.tracer.counters, {'lines read': 3000, 'bytes read': 9000})
+        self.assertIn('read', self.tracer.phases)
+
+    def test_reading_is_lazy(self):
+        lines = trace.reading(iter([u'a\n', u'b\n', u'c\n']))
+        next(lines)
+        self.assertEqual(self.tracer.counters, {'lines read': 1, 'bytes read': 2})
+
+    def test_main_profile_options(self):
+        from changelog.main import main
+        for args in (['--profile', 'current'], ['--profile-format', 'json', 'current'],
+                     ['--profile-stats=cl.prof', 'current']):
+            trace.stop()
+            with patch('changelog.commands.cli') as cli:
+                main(args)
+            cli.assert_called_once_with(args=args)
+            # Started before the click commands were imported
+            self.assertIn('import', trace.stop().phases)
+
+    def test_report_json(self):
+        stream = io.StringIO()
+        with trace.phase('parse'):
+            pass
+        self.tracer.report(stream)
+        report = json.loads(stream.getvalue())
+        self.assertEqual(sorted(report), ['counters', 'phases', 'total'])
+        self.assertIn('parse', report['phases'])
+        self.assertEqual(report['counters']['bytes written'], 0)
+
+    def test_report_table(self):
+        stream = io.StringIO()
+        self.tracer.format = 'table'
+        self.tracer.report(stream)
+        self.assertIn('total', stream.getvalue())
+        self.assertIn('lines read', stream.getvalue())
+
+    @patch.dict(_VERSIONS, clear=True)
+    def test_mutation_phases(self):
+        directory = tempfile.mkdtemp()
+        try:
+            CL = ChangelogUtils(os.path.join(directory, 'CHANGELOG.md'))
+            with open(CL.CHANGELOG, 'w') as changelog:
+                changelog.write(INIT)
+            CL.update_section('new', 'traced')
+            CL.cut_release('suggest')
+        finally:
+            shutil.rmtree(directory)
+        for name in ('read', 'parse', 'match', 'mutate', 'crunch', 'write'):
+            self.assertIn(name, self.tracer.phases)
+        self.assertGreater(self.tracer.counters['lines written'], 0)
+        self.assertGreater(self.tracer.counters['bytes written'], len(INIT))
@@ -1,5 +1,8 @@
 import unittest
 import os
+import random
+import shutil
+import tempfile
 from datetime import date
 
 try:
@@ -9,8 +12,93 @@ except ImportError:
 
 from packaging.version import Version
 
-from changelog.utils import ChangelogUtils
-from changelog.exceptions import ChangelogDoesNotExistError
+from changelog.utils import ChangelogUtils, parse_version
+from changelog.exceptions import ChangelogDoesNotExistError, ChangelogLockTimeoutError
+from changelog import files, versions
+from changelog.files import FileLock
+from changelog.templates import INIT
+
+
+ARCHIVE_SAMPLE = """# CHANGELOG
+
+## Unreleased
+---
+
+### New
+* added feature y
+
+### Fixes
+
+
+## 0.3.0 - (2018-02-01)
+---
+
+### New
+* added feature x
+
+## 0.2.0 - (2017-06-09)
+---
+
+### New
+* added feature w
+
+## 0.1.0 - (2017-01-01)
+---
+
+### Fixes
+* fixed bug 0
+"""
+
+
+def quadratic_crunch_lines(line_list):
+    """Original pop-based crunch_lines, kept as the reference for its linear replacement"""
+    i = 2
+    while i < len(line_list):
+        here = line_list[i]
+        minus_1 = line_list[i - 1]
+        minus_2 = line_list[i - 2]
+        if here == minus_1 == minus_2 == "\n":
+            line_list.pop(i)
+        elif minus_2 == '---\n' and here == minus_1 == '\n':
+            line_list.pop(i)
+        else:
+            i += 1
+    return line_list
+
+
+class ReplaceFileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'source')
+        self.target = os.path.join(self.directory, 'target')
+        for path in (self.source, self.target):
+            with open(path, 'w') as changelog:
+                changelog.write(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replace_file(self):
+        files.replace_file(self.source, self.target)
+        self.assertEqual(os.listdir(self.directory), ['target'])
+        with open(self.target) as changelog:
+            self.assertEqual(changelog.read(), self.source)
+
+    def test_replace_file_without_os_replace(self):
+        with patch.object(files, 'hasattr', return_value=False, create=True):
+            self.test_replace_file()
+
+
+def open_paths():
+    """Gets the paths of the files this process has open"""
+    directory = '/proc/self/fd'
+    paths = []
+    for fd in os.listdir(directory):
+        try:
+            paths.append(os.readlink(os.path.join(directory, fd)))
+        except OSError:
+            pass
+    return paths
 
 
 class UtilsTestCase(unittest.TestCase):
@@ -48,6 +136,13 @@ class UtilsTestCase(unittest.TestCase):
         ]
         self.assertEqual(self.cl.crunch_lines(document), ['this\n', '---\n', '\n', 'that\n'])
 
+    def test_crunch_lines_matches_reference(self):
+        rng = random.Random(706)
+        choices = ["\n", "\n", "\n", "---\n", "## 0.1.0 - (2017-06-09)\n", "* entry\n"]
+        for _ in range(200):
+            document = [rng.choice(choices) for _ in range(rng.randrange(30))]
+            self.assertEqual(self.cl.crunch_lines(list(document)), quadratic_crunch_lines(list(document)))
+
     def test_get_release_suggestion_patch(self):
         with patch.object(ChangelogUtils, 'get_changes', return_value={'changes': ''}):
             CL = ChangelogUtils()
@@ -66,8 +161,23 @@ class UtilsTestCase(unittest.TestCase):
             result = CL.get_release_suggestion()
             self.assertEqual(result, 'major')
 
+    def test_parse_version_memoized(self):
+        version = parse_version('1.2.3+user.1')
+        self.assertEqual(version, Version('1.2.3+user.1'))
+        self.assertIs(parse_version('1.2.3+user.1'), version)
+
+    def test_parse_version_cache_bounded(self):
+        with patch.object(versions, 'VERSION_CACHE_SIZE', 2), patch.dict(versions._VERSIONS, clear=True):
+            first = parse_version('1.0.0')
+            parse_version('2.0.0')
+            self.assertIs(parse_version('1.0.0'), first)
+            parse_version('3.0.0')
+            self.assertEqual(list(versions._VERSIONS), ['1.0.0', '3.0.0'])
+            self.assertIs(parse_version('1.0.0'), first)
+
     def test_update_section(self):
-        with patch.object(ChangelogUtils, 'write_changelog') as mock_write:
+        with patch.object(ChangelogUtils, 'write_changelog') as mock_write, \
+                patch.object(ChangelogUtils, 'insert_line_in_place', return_value=False):
             sample_data = [
                 "## Unreleased\n",
                 "---\n",
@@ -78,10 +188,11 @@ class UtilsTestCase(unittest.TestCase):
                 "\n",
                 "### Breaks\n",
             ]
-            with patch.object(ChangelogUtils, 'get_changelog_data', return_value=sample_data) as mock_read:
+            with patch.object(ChangelogUtils, 'iter_changelog_lines', return_value=sample_data) as mock_read:
                 CL = ChangelogUtils()
                 CL.update_section("new", 'this is a test')
-        mock_write.assert_called_once_with([
+        mock_write.assert_called_once()
+        self.assertEqual(list(mock_write.call_args[0][0]), [
             "## Unreleased\n",
             "---\n",
             "\n",
@@ -108,14 +219,26 @@ class UtilsTestCase(unittest.TestCase):
             "## 0.3.2 - (2017-06-09)\n",
             "---\n",
         ]
-        with patch.object(ChangelogUtils, 'get_changelog_data', return_value=sample_data) as mock_read:
+        with patch.object(ChangelogUtils, 'iter_changelog_lines', return_value=sample_data) as mock_read:
+            CL = ChangelogUtils()
+            result = CL.get_current_version()
+        self.assertEqual(result, Version('0.3.2'))
+
+    def test_get_current_version_stops_reading(self):
+        sample_data = iter([
+            "## Unreleased\n",
+            "## 0.3.2 - (2017-06-09)\n",
+            "## 0.3.1 - (2017-06-01)\n",
+        ])
+        with patch.object(ChangelogUtils, 'iter_changelog_lines', return_value=sample_data):
             CL = ChangelogUtils()
             result = CL.get_current_version()
         self.assertEqual(result, Version('0.3.2'))
+        self.assertEqual(list(sample_data), ["## 0.3.1 - (2017-06-01)\n"])
 
     def test_get_current_version_default(self):
         sample_data = []
-        with patch.object(ChangelogUtils, 'get_changelog_data', return_value=sample_data) as mock_read:
+        with patch.object(ChangelogUtils, 'iter_changelog_lines', return_value=sample_data) as mock_read:
             CL = ChangelogUtils()
             result = CL.get_current_version()
         self.assertEqual(result, Version('0.0.0'))
@@ -137,7 +260,7 @@ class UtilsTestCase(unittest.TestCase):
             "## 0.3.2 - (2017-06-09)\n",
             "---\n",
         ]
-        with patch.object(ChangelogUtils, 'get_changelog_data', return_value=sample_data) as mock_read:
+        with patch.object(ChangelogUtils, 'iter_changelog_lines', return_value=sample_data) as mock_read:
             CL = ChangelogUtils()
             result = CL.get_changes()
         self.assertTrue('new' in result)
@@ -253,6 +376,111 @@ class ChangelogFileOperationTestCase(unittest.TestCase):
         modified = self.CL.get_changelog_data()
         self.assertEqual(len(original) + 1, len(modified))
 
+    def test_update_section_in_place(self):
+        self.CL.initialize_changelog_file()
+        expected = self.CL.get_document().insert_entry('fix', 'fixed a bug')
+        with patch.object(ChangelogUtils, 'write_changelog') as mock_write:
+            self.CL.update_section('fix', 'fixed a bug')
+        mock_write.assert_not_called()
+        self.assertEqual(self.CL.get_changelog_data(), expected)
+
+    @unittest.skipUnless(os.path.isdir('/proc/self/fd'), "lists open files through /proc")
+    def test_replaces_closed_changelog(self):
+        # Windows cannot replace a file that is still open
+        self.CL.initialize_changelog_file()
+        path = os.path.abspath(self.CL.CHANGELOG)
+        replace = files.replace_file
+
+        def replace_closed(source, target):
+            self.assertNotIn(path, open_paths())
+            replace(source, target)
+
+        with patch.object(files, 'replace_file', side_effect=replace_closed) as mock_replace:
+            self.CL.update_section('fix', 'fixed a bug')
+            self.CL.cut_release('patch')
+            self.CL.update_section('fix', 'fixed another bug')
+            self.CL.cut_release('patch')
+        self.assertEqual(mock_replace.call_count, 4)
+        self.assertEqual(self.CL.get_current_version(), parse_version('0.0.2'))
+
+    @unittest.skipUnless(hasattr(os, 'symlink') and os.name == 'posix', "creates a symbolic link")
+    def test_writes_through_symlink(self):
+        directory = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(directory, 'docs'))
+            target = os.path.join(directory, 'docs', 'CHANGELOG.md')
+            link = os.path.join(directory, 'CHANGELOG.md')
+            with open(target, 'w') as changelog:
+                changelog.write(INIT)
+            os.symlink(os.path.join('docs', 'CHANGELOG.md'), link)
+            self.assertEqual(files.lock_path(link), files.lock_path(target))
+            CL = ChangelogUtils(link)
+            CL.update_section('new', 'via symlink')
+            CL.cut_release('minor')
+            CL.update_section('fix', 'fixed a bug')
+            self.assertTrue(os.path.islink(link))
+            self.assertEqual(ChangelogUtils(target).get_current_version(), parse_version('0.1.0'))
+            self.assertIn('* fixed a bug\n', ChangelogUtils(target).get_changelog_data())
+            self.assertEqual(sorted(os.listdir(directory)), ['CHANGELOG.md', 'docs'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_update_sections_empty(self):
+        self.CL.initialize_changelog_file()
+        with patch.object(ChangelogUtils, 'locked', side_effect=AssertionError):
+            self.CL.update_sections([])
+
+    def test_update_section_in_place_crlf(self):
+        with open('TEST_CHANGELOG.md', 'wb') as changelog:
+            changelog.write(INIT.replace('\n', '\r\n').replace('### Fixes', '### Fixes  ').encode('utf-8'))
+        self.assertTrue(self.CL.insert_line_in_place('fix', '* fixed a bug\n'))
+        self.CL.update_sections([('new', 'added a feature')])
+        with open('TEST_CHANGELOG.md', 'rb') as changelog:
+            data = changelog.read()
+        self.assertIn(b'### Fixes  \r\n* fixed a bug\r\n', data)
+        self.assertIn(b'### New\r\n* added a feature\r\n', data)
+        self.assertEqual(data.count(b'\n'), data.count(b'\r\n'))
+        self.assertEqual(self.CL.get_changes(), {'new': 'added a feature', 'fix': 'fixed a bug'})
+
+    def test_update_section_in_place_mismatch(self):
+        with open('TEST_CHANGELOG.md', 'w') as changelog:
+            changelog.write(INIT.rstrip('\n'))
+        self.assertFalse(self.CL.insert_line_in_place('break', '* removed x\n'))
+        self.CL.update_section('break', 'removed x')
+        self.assertEqual(self.CL.get_changelog_data()[-2:], ['### Breaks\n', '* removed x\n'])
+
+    def test_write_changelog_atomic(self):
+        self.CL.initialize_changelog_file()
+        original = self.CL.get_changelog_data()
+
+        def broken_lines():
+            yield "partial\n"
+            raise IOError("disk full")
+
+        self.assertRaises(IOError, self.CL.write_changelog, broken_lines())
+        self.assertEqual(self.CL.get_changelog_data(), original)
+        self.assertEqual([name for name in os.listdir('.') if 'TEST_CHANGELOG.md.' in name], [])
+
+    def test_lock_timeout(self):
+        self.CL.initialize_changelog_file()
+        self.CL.LOCK_TIMEOUT = 0.1
+        with FileLock('TEST_CHANGELOG.md'):
+            self.assertRaises(ChangelogLockTimeoutError, self.CL.update_section, 'new', 'blocked')
+        self.CL.update_section('new', 'unblocked')
+        self.assertIn('* unblocked\n', self.CL.get_changelog_data())
+
+    def test_lock_file_removed_on_windows(self):
+        with patch.object(files, 'fcntl', None), patch.object(files, 'msvcrt', create=True):
+            with FileLock('TEST_CHANGELOG.md'):
+                self.assertTrue(os.path.exists('.TEST_CHANGELOG.md.lock'))
+            self.assertFalse(os.path.exists('.TEST_CHANGELOG.md.lock'))
+            # Another process still has it open
+            with patch('os.remove', side_effect=OSError):
+                with FileLock('TEST_CHANGELOG.md'):
+                    pass
+            self.assertTrue(os.path.exists('.TEST_CHANGELOG.md.lock'))
+        os.remove('.TEST_CHANGELOG.md.lock')
+
     def test_cut_release(self):
         self.CL.initialize_changelog_file()
         self.CL.update_section('new', "this is a test")
@@ -265,6 +493,97 @@ class ChangelogFileOperationTestCase(unittest.TestCase):
         data2 = self.CL.get_changelog_data()
         self.assertTrue('## Unreleased\n' in data2)
 
+    def test_cut_release_copies_history(self):
+        self.CL.initialize_changelog_file()
+        self.CL.update_section('new', "this is a test")
+        self.CL.cut_release('suggest')
+        with open('TEST_CHANGELOG.md', 'ab') as changelog:
+            changelog.write(b'\n\n\n\nuntouched \xc3\xa9\n')
+        with open('TEST_CHANGELOG.md', 'rb') as changelog:
+            history = changelog.read()
+        history = history[history.index(b'## 0.1.0'):]
+        self.CL.update_section('fix', "fixed a bug")
+        with patch.object(ChangelogUtils, 'write_changelog') as mock_write:
+            self.CL.cut_release('suggest')
+        mock_write.assert_not_called()
+        with open('TEST_CHANGELOG.md', 'rb') as changelog:
+            data = changelog.read()
+        self.assertTrue(data.endswith(history))
+        self.assertIn(b'* fixed a bug\n', data[:-len(history)])
+
+    def test_cut_release_crlf(self):
+        self.CL.initialize_changelog_file()
+        self.CL.update_section('new', "this is a test")
+        self.CL.cut_release('suggest')
+        with open('TEST_CHANGELOG.md', 'rb') as changelog:
+            data = changelog.read()
+        with open('TEST_CHANGELOG.md', 'wb') as changelog:
+            changelog.write(data.replace(b'\n', b'\r\n'))
+        self.CL.update_section('fix', "fixed a bug")
+        self.CL.cut_release('suggest')
+        data = self.CL.get_changelog_data()
+        self.assertIn('## 0.1.1 - ({})\r\n'.format(date.today().isoformat()), data)
+        self.assertIn('## 0.1.0 - ({})\r\n'.format(date.today().isoformat()), data)
+        self.assertEqual([line for line in data if not line.endswith('\r\n')], [])
+        self.assertEqual(str(self.CL.get_current_version()), '0.1.1')
+
+    def test_mutations_stream(self):
+        try:
+            import tracemalloc
+        except ImportError:
+            self.skipTest("tracemalloc needs Python 3.4")
+        self.CL.initialize_changelog_file()
+        with open('TEST_CHANGELOG.md', 'a') as changelog:
+            for release in range(2000, 0, -1):
+                changelog.write("## 0.{}.0 - (2017-06-09)\n---\n\n### New\n".format(release))
+                changelog.writelines("* entry {} of a long release\n".format(i) for i in range(20))
+                changelog.write("\n")
+        size = os.path.getsize('TEST_CHANGELOG.md')
+        tracemalloc.start()
+        try:
+            self.CL.update_sections([('new', 'streamed'), ('fix', 'streamed')])
+            with patch.object(ChangelogUtils, '_write_head', return_value=False):
+                self.CL.cut_release('suggest')
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, size / 4)
+        self.assertIn('## 0.2001.0 - ({})\n'.format(date.today().isoformat()), self.CL.get_changelog_data())
+
+    def write_releases(self, *versions):
+        self.CL.initialize_changelog_file()
+        for version in versions:
+            self.CL.update_section('fix', "fixed {}".format(version))
+            with patch.object(ChangelogUtils, 'get_new_release_version', return_value=version):
+                self.CL.cut_release()
+
+    def test_find_release(self):
+        self.write_releases('0.1.0', '0.2.0+user.1', '1.0.0')
+        self.assertEqual(self.CL.find_release('1.0').version, '1.0.0')
+        self.assertEqual(self.CL.find_release('0.2.0+user.1').version, '0.2.0+user.1')
+        self.assertIsNone(self.CL.find_release('0.3.0'))
+        self.assertRaises(ValueError, self.CL.find_release, 'latest')
+        self.assertEqual(self.CL.get_release_record(self.CL.find_release('0.1.0')), {
+            'version': '0.1.0', 'local': None, 'date': date.today().isoformat(),
+            'sections': {'fix': ['fixed 0.1.0']},
+        })
+
+    def test_get_releases_between(self):
+        self.write_releases('0.1.0', '0.2.0', '0.3.0', '1.0.0')
+        for start, end in [('0.1.0', '0.3.0'), ('0.3.0', '0.1.0'), ('0.1.5', '0.3.0')]:
+            self.assertEqual([r.version for r in self.CL.get_releases_between(start, end)], ['0.3.0', '0.2.0'])
+
+    def test_get_release_lines_crlf(self):
+        self.write_releases('0.1.0', '0.2.0')
+        with open('TEST_CHANGELOG.md', 'rb') as changelog:
+            data = changelog.read()
+        with open('TEST_CHANGELOG.md', 'wb') as changelog:
+            changelog.write(data.replace(b'\n', b'\r\n'))
+        CL = ChangelogUtils('TEST_CHANGELOG.md')
+        lines = CL.get_release_lines(CL.find_release('0.1.0'))
+        self.assertEqual(lines[0], '## 0.1.0 - ({})\r\n'.format(date.today().isoformat()))
+        self.assertIn('* fixed 0.1.0\r\n', lines)
+
     def test_match_version_canonical(self):
         line = "## 0.2.1 - (2017-06-09)"
         self.assertEqual(self.CL.match_version(line), Version('0.2.1'))
@@ -286,3 +605,71 @@ class ChangelogFileOperationTestCase(unittest.TestCase):
             os.remove('TEST_CHANGELOG.md')
         except Exception:
             pass
+
+
+class ArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'CHANGELOG.md')
+        with open(self.path, 'w') as changelog:
+            changelog.write(ARCHIVE_SAMPLE)
+        self.CL = ChangelogUtils(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, name):
+        with open(os.path.join(self.directory, name), 'rb') as changelog:
+            return changelog.read().decode('utf-8')
+
+    def test_archive_keep(self):
+        records = list(ChangelogUtils(self.path).iter_release_records())
+        paths = self.CL.archive(keep=1)
+        self.assertEqual(paths, [os.path.join(self.directory, 'CHANGELOG-2017.md')])
+        data = self.read('CHANGELOG.md')
+        self.assertEqual(data, ARCHIVE_SAMPLE[:ARCHIVE_SAMPLE.index('## 0.2.0')] +
+                         "Older releases are archived in [CHANGELOG-2017.md](CHANGELOG-2017.md).\n")
+        archive = self.read('CHANGELOG-2017.md')
+        self.assertTrue(archive.startswith('# CHANGELOG (2017)\n'))
+        self.assertTrue(archive.endswith(ARCHIVE_SAMPLE[ARCHIVE_SAMPLE.index('## 0.2.0'):] + '\n'))
+        CL = ChangelogUtils(self.path)
+        self.assertEqual(list(CL.iter_release_records()), records)
+        self.assertEqual(self.CL.archive(keep=1), [])
+
+    def test_archive_before(self):
+        self.CL.archive(before='0.2.0')
+        self.assertEqual(self.CL.archive(before='0.4.0'), [
+            os.path.join(self.directory, 'CHANGELOG-2018.md'), os.path.join(self.directory, 'CHANGELOG-2017.md'),
+        ])
+        self.assertIn("archived in [CHANGELOG-2018.md](CHANGELOG-2018.md), [CHANGELOG-2017.md](CHANGELOG-2017.md).",
+                      self.read('CHANGELOG.md'))
+        archive = self.read('CHANGELOG-2017.md')
+        self.assertEqual(archive.count('## 0.1.0'), 1)
+        self.assertLess(archive.index('## 0.2.0'), archive.index('## 0.1.0'))
+        CL = ChangelogUtils(self.path)
+        self.assertEqual(CL.get_current_version(), parse_version('0.3.0'))
+        self.assertEqual(CL.get_new_release_version('suggest'), '0.4.0')
+        self.assertIn('* added feature x\n', CL.get_current_lines())
+        self.assertEqual(CL.find_release('0.1').version, '0.1.0')
+        self.assertEqual(CL.get_release_lines(CL.find_release('0.2.0'))[-2:], ['* added feature w\n', '\n'])
+        self.assertEqual([r.version for r in CL.get_releases_between('0.0.0', '0.2.0')], ['0.2.0', '0.1.0'])
+        CL.cut_release()
+        self.assertEqual([r['version'] for r in CL.iter_release_records()], ['0.4.0', '0.3.0', '0.2.0', '0.1.0'])
+
+    def test_archives_read_lazily(self):
+        self.CL.archive(keep=2)
+        CL = ChangelogUtils(self.path)
+        with patch.object(ChangelogUtils, 'get_archives', side_effect=AssertionError):
+            self.assertEqual(CL.get_current_version(), parse_version('0.3.0'))
+            self.assertEqual(CL.get_release_lines(CL.find_release('0.2.0'))[0], '## 0.2.0 - (2017-06-09)\n')
+            self.assertEqual(len(CL.get_releases_between('0.2.0', '0.3.0')), 1)
+            self.assertNotIn('Older releases', ''.join(CL.get_current_lines()))
+        self.assertEqual(len(CL.get_releases_between('0.0.0', '0.3.0')), 3)
+
+    def test_archive_crlf(self):
+        with open(self.path, 'wb') as changelog:
+            changelog.write(ARCHIVE_SAMPLE.replace('\n', '\r\n').encode('utf-8'))
+        self.CL.archive(keep=0)
+        for name in ('CHANGELOG.md', 'CHANGELOG-2017.md', 'CHANGELOG-2018.md'):
+            self.assertNotIn('\n', self.read(name).replace('\r\n', ''))
+        self.assertEqual(ChangelogUtils(self.path).get_changes(), {'new': 'added feature y'})